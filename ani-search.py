@@ -1,23 +1,49 @@
 #!/usr/bin/env python
 
+# Annotations aren't evaluated, so they can name modules not imported yet
+from __future__ import annotations
+
 import logging
 from typer import Typer
 from rich.logging import RichHandler
 from rich.console import Console
 from rich.theme import Theme
-from rich.status import Status
-from rich import traceback
 
 from os.path import dirname, realpath
+from enum import Enum
+import os
+import sys
 import json
 import asyncio
-from aiohttp import ClientSession
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import queryables
+from queryables import QUERYABLES, queryables_enum, get_queryable, lazy_import
+from queryables.formats import formats_enum, write_entries, missing_dependency
+
+# aiohttp, bs4 and the queryables are only imported by the commands,
+# so --help and completions start without them
+qq = lazy_import("queryables.queryable")
+qt = lazy_import("queryables.timings")
+qo = lazy_import("queryables.offline")
 
-import queryables.queryable as qq
-from queryables.queryable import Queryable
-from queryables import queryables_list, queryables_enum, queryables_dict
+if TYPE_CHECKING:
+    import aiohttp
+    from rich.status import Status
+    from queryables.ranking import Ranking
 
 CONFIG_FILE = dirname(realpath(__file__)) + "/config.json"
+SOCKET_FILE = dirname(realpath(__file__)) + "/ani-search.sock"
+# Whole batches are sent as single lines
+STREAM_LIMIT = 2 ** 26
+# (query, queryable) searches running at once in batch
+BATCH_CONCURRENCY = 8
+# Seconds between redraws of a table as its batches arrive, each one
+# building and drawing all of its entries again
+REDRAW_SECONDS = 0.25
+
+cache_formats_enum = Enum('CacheFormats', {f: f for f in ("json", "columnar")})
 
 config = {}
 rich_log = logging.getLogger("rich")
@@ -38,19 +64,40 @@ c = Console(theme=Theme({
 print = c.print
 
 
-@app.command()
-def search(
-    query: str,
-    show_everything: bool = False,
-    debug: bool = False,
-    cls: queryables_enum = None,
-    strip_http: bool = None
-):
-    query = query.strip().lower()
-    if debug:
-        logging.getLogger().setLevel(logging.DEBUG)
+class LiveTables:
+    """ One table per queryable, redrawn on a single Live display """
+
+    def __init__(self):
+        from rich.live import Live
+
+        self.tables = {}
+        self.live = Live(console=c, auto_refresh=False)
+
+    def __enter__(self):
+        self.live.start()
+        return self
+
+    def __exit__(self, *_):
+        self.live.stop()
+
+    def update(self, cls: qq.Queryable, table):
+        from rich.align import Align
+        from rich.console import Group
+
+        self.tables[cls] = Align.center(table)
+        self.live.update(Group(*self.tables.values()), refresh=True)
+
+
+def set_debug():
+    """ Debug logs and rich tracebacks, only imported when debugging """
+    from rich import traceback
 
-    # Read config file
+    logging.getLogger().setLevel(logging.DEBUG)
+    traceback.install()
+
+
+def load_config(debug: bool = False):
+    """ Reads the config file into config, reporting errors """
     try:
         with open(CONFIG_FILE, "r") as f:
             data = json.load(f)
@@ -75,12 +122,26 @@ def search(
         else:
             print('\n', e, '\n', justify="center")
 
+
+def apply_config(strip_http: bool = None):
+    """ Global options of the config file, which the command line overrides """
     if config.get('cache_hour_limit'):
         logging.info(
             f"Changing cache hour limit from {qq.cache_hour_limit} to {config.get('cache_hour_limit')}")
         qq.cache_hour_limit = config.get(
             'cache_hour_limit', qq.cache_hour_limit)
 
+    for option in ('response_cache_seconds', 'response_cache_mb', 'cache_format'):
+        if config.get(option) is not None:
+            logging.info(
+                f"Changing {option} from {getattr(qq, option)} to {config.get(option)}")
+            setattr(qq, option, config.get(option))
+
+    if config.get('stale_while_revalidate') is not None:
+        logging.info(
+            f"Changing stale_while_revalidate from {qq.stale_while_revalidate} to {config.get('stale_while_revalidate')}")
+        qq.stale_while_revalidate = config.get('stale_while_revalidate')
+
     if strip_http is not None:
         logging.info(
             f"Changing strip_http from {qq.strip_http} to {strip_http}")
@@ -90,9 +151,50 @@ def search(
             f"Changing strip_http from {qq.strip_http} to {config.get('strip_http')}")
         qq.strip_http = config.get('strip_http')
 
+    if config.get('html_parser'):
+        logging.info(
+            f"Changing html_parser from {qq.html_parser} to {config.get('html_parser')}")
+        qq.html_parser = config.get('html_parser')
+
+
+@app.command()
+def search(
+    query: str,
+    show_everything: bool = False,
+    debug: bool = False,
+    cls: queryables_enum = None,
+    strip_http: bool = None,
+    stream: bool = False,
+    workers: int = None,
+    server: bool = False,
+    format: formats_enum = formats_enum.table,
+    merge: bool = False,
+    top: int = None,
+    timings: str = None,
+    page: int = 0,
+    offline: bool = False
+):
+    """
+    Searches query in every queryable, --page N showing their Nth page.
+    --offline searches what `sync` crawled instead. --timings FILE shows how long each stage took and writes their trace
+    to FILE, for Perfetto or chrome://tracing
+    """
+    query = query.strip().lower()
+    if debug:
+        set_debug()
+    if timings:
+        qt.enable()
+
+    load_config(debug)
+    apply_config(strip_http)
+
+    if workers is None:
+        workers = config.get('workers', 0)
+
     # Select queryables to run
-    cls = queryables_dict.get(cls and cls.value or "")
-    cls_list = [cls] if cls else queryables_list
+    cls_list = [get_queryable(cls.value)] if cls else queryables.queryables_list
+    if offline:
+        cls_list = [c for c in cls_list if c.SYNC]
 
     if not cls_list:
         print("No queryables to run")
@@ -100,39 +202,385 @@ def search(
 
     status = c.status("[status]Starting")
 
-    if not debug:
-        status.start()
-        print("\n" * 2)
+    # One list of every queryable's entries
+    ranking = None
+    if merge:
+        from queryables.ranking import Ranking, TOP
+
+        merge_config = config.get('merge', {})
+        ranking = Ranking(query, top or merge_config.get('top', TOP),
+                          merge_config.get('weights'))
+
+    # Entries alone on stdout, messages go to stderr
+    if format != formats_enum.table:
+        c.file = sys.stderr
+        if missing_dependency(format.value):
+            print(missing_dependency(format.value))
+            return
+
+        asyncio.run(
+            tryq_wrapper(cls_list, debug=debug, status=status, fmt=format.value, remote=server,
+                         ranking=ranking, workers=workers, query=query, page=page, offline=offline, all_pages=show_everything))
+
+        for queryable, entry, _ in (ranking and ranking.results() or ()):
+            write_entries(format.value, queryable, [entry])
+
+    # Only one Live display can run, so streaming replaces the status
+    elif stream:
+        with LiveTables() as live:
+            asyncio.run(
+                tryq_wrapper(cls_list, debug=debug, status=status, live=live, remote=server,
+                             ranking=ranking, workers=workers, query=query, page=page, offline=offline, all_pages=show_everything))
+    else:
+        if not debug:
+            status.start()
+            print("\n" * 2)
+
+        asyncio.run(
+            tryq_wrapper(cls_list, debug=debug, status=status, remote=server,
+                         ranking=ranking, workers=workers, query=query, page=page, offline=offline, all_pages=show_everything))
+
+        status.stop()
+
+        if ranking and ranking.total:
+            print(ranking.make_table(), justify="center")
+
+    if timings:
+        print(qt.make_table({cls.__name__: cls.NAME() for cls in cls_list}), justify="center")
+        qt.write_trace(timings)
+        print(f"Trace written to {timings}", justify="center")
+
+    logging.debug("Cache - " + ", ".join(
+        f"{k}: {v}" for k, v in qq.cache_stats.items()))
+    logging.debug("Requests - " + ", ".join(
+        f"{k}: {v}" for k, v in qq.request_stats.items()))
+
+
+@app.command()
+def batch(
+    file: str,
+    show_everything: bool = False,
+    debug: bool = False,
+    cls: queryables_enum = None,
+    concurrency: int = None,
+    workers: int = None,
+    output: str = None
+):
+    """
+    Searches every query in file (one per line, - for stdin), writing
+    a JSON line for each query and queryable
+    """
+    if debug:
+        set_debug()
+
+    load_config(debug)
+    apply_config()
+    # Catalogs and their indexes are decoded once for every query
+    qq.memory_cache = True
+
+    if workers is None:
+        workers = config.get('workers', 0)
+    if concurrency is None:
+        concurrency = config.get('batch_concurrency', BATCH_CONCURRENCY)
+
+    with (sys.stdin if file == "-" else open(file, "r", encoding="utf-8")) as f:
+        # Repeated queries are searched once
+        queries = list(dict.fromkeys(
+            q.strip().lower() for q in f if q.strip()))
+
+    cls_list = [get_queryable(cls.value)] if cls else queryables.queryables_list
+
+    with (sys.stdout if output is None else open(output, "w", encoding="utf-8")) as out:
+        asyncio.run(batch_wrapper(
+            cls_list, queries, out=out, debug=debug, concurrency=concurrency,
+            workers=workers, all_pages=show_everything))
+
+    logging.debug("Cache - " + ", ".join(
+        f"{k}: {v}" for k, v in qq.cache_stats.items()))
+    logging.debug("Requests - " + ", ".join(
+        f"{k}: {v}" for k, v in qq.request_stats.items()))
+
+
+async def batch_wrapper(cls_list, queries: list[str], out, debug: bool, concurrency: int, workers: int = 0, **kwargs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search_one(cls: qq.Queryable, query: str):
+        line = {"query": query, "queryable": cls.__name__}
 
-    asyncio.run(
-        tryq_wrapper(cls_list, debug=debug, status=status,
-                     query=query, all_pages=show_everything))
+        async with semaphore:
+            try:
+                data = await qq.collect_stream(
+                    request_stream(cls, query=query, session=session, **kwargs))
+                assert data, "0 entries found."
+                data = cls.parse_data(data)
+                line.update(data, entries=[e.as_dict() for e in data["entries"]])
+            except Exception as e:
+                if debug:
+                    rich_log.exception(e)
+                line["error"] = str(e) or type(e).__name__
 
-    status.stop()
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
 
+    qq.start_workers(workers)
+
+    try:
+        async with qq.make_session(config.get('connector'), config.get('timeout')) as session:
+            await asyncio.gather(*(
+                search_one(cls, query) for query in queries for cls in cls_list))
+
+            await qq.wait_background()
+    finally:
+        qq.stop_workers()
+
+
+@app.command()
+def sync(
+    debug: bool = False,
+    cls: queryables_enum = None,
+    workers: int = None,
+    full: bool = False
+):
+    """
+    Crawls the listings of the trackers into the index searched by
+    `search --offline`, only until the entries of their last sync
+    (every page with --full)
+    """
+    if debug:
+        set_debug()
 
-async def tryq_wrapper(cls_list, **kwargs):
-    async with ClientSession() as session:
-        tasks = []
-        for cls in cls_list:
-            task = asyncio.create_task(
-                try_queryable(cls=cls, session=session, **kwargs),
-                name=cls.__name__
-            )
-            tasks.append(task)
+    load_config(debug)
+    apply_config()
 
-        await asyncio.gather(*tasks)
+    if workers is None:
+        workers = config.get('workers', 0)
 
+    cls_list = [get_queryable(cls.value)] if cls else queryables.queryables_list
+    cls_list = [c for c in cls_list if c.SYNC]
 
-async def try_queryable(cls: Queryable, debug: bool, status: Status, **kwargs):
-    if not (isinstance(cls, type) and issubclass(cls, Queryable)):
+    if not cls_list:
+        print("No queryables to sync")
+        return
+
+    asyncio.run(sync_wrapper(cls_list, debug=debug, workers=workers, full=full))
+
+
+async def sync_wrapper(cls_list, debug: bool, workers: int = 0, full: bool = False):
+
+    async def sync_one(cls: qq.Queryable):
+        options = {**config.get(cls.__name__, {})}
+        options.pop("deadline", None)
+
+        try:
+            result = await qo.sync_queryable(cls, session, full=full, **options)
+            print(f"{cls.NAME()} - {result['new']} new entries, {result['synced']} synced"
+                  + ("" if result["incremental"] else " (every page)"))
+        except (NotImplementedError, ConnectionError, qq.MissingCookiesError, qq.ExpiredCookiesError) as e:
+            if debug:
+                logging.error(e)
+            else:
+                print(e)
+        except Exception as e:
+            if debug:
+                rich_log.exception(e)
+            else:
+                print(f"{cls.NAME()} - Error: {e}")
+
+    qq.start_workers(workers)
+
+    try:
+        async with qq.make_session(config.get('connector'), config.get('timeout')) as session:
+            await asyncio.gather(*(sync_one(cls) for cls in cls_list))
+    finally:
+        qq.stop_workers()
+
+
+@app.command()
+def convert_cache(
+    debug: bool = False,
+    format: cache_formats_enum = None
+):
+    """
+    Rewrites the cached catalogs and indexes in the "cache_format" of the
+    config file, or --format, after importing an old cache.json
+    """
+    if debug:
+        set_debug()
+
+    load_config(debug)
+    apply_config()
+
+    format = format.value if format else qq.cache_format
+    print(f"Converted {qq.convert_cache(format)} cached values to {format}")
+
+
+@app.command()
+def serve(
+    debug: bool = False,
+    workers: int = None,
+    socket: str = None
+):
+    """
+    Answers `search --server` through a Unix socket, keeping the
+    connections, cached catalogs and their indexes warm between searches
+    """
+    if debug:
+        set_debug()
+
+    load_config(debug)
+    apply_config()
+    qq.memory_cache = True
+
+    if workers is None:
+        workers = config.get('workers', 0)
+
+    try:
+        asyncio.run(serve_queries(
+            socket or config.get('socket', SOCKET_FILE), workers=workers, debug=debug))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_queries(path: str, workers: int = 0, debug: bool = False):
+    qq.start_workers(workers)
+
+    try:
+        async with qq.make_session(config.get('connector'), config.get('timeout')) as session:
+
+            async def answer(reader, writer):
+                await answer_query(reader, writer, session=session, debug=debug)
+
+            server = await asyncio.start_unix_server(answer, path, limit=STREAM_LIMIT)
+            print(f"Listening on {path}")
+
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                await qq.wait_background()
+    finally:
+        qq.stop_workers()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def answer_query(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, session: aiohttp.ClientSession, debug: bool):
+    """ One JSON line with a request, answered by one JSON line per batch """
+
+    def send(message: dict):
+        writer.write(json.dumps(message, ensure_ascii=False).encode() + b"\n")
+
+    try:
+        request = json.loads(await reader.readline())
+        cls = get_queryable(request["cls"])
+
+        async for batch in request_stream(
+                cls, session=session,
+                query=request["query"].strip().lower(),
+                all_pages=request.get("all_pages", False),
+                page=request.get("page", 0)):
+            batch = cls.parse_data(batch)
+            send({"batch": {**batch, "entries": [e.as_dict() for e in batch["entries"]]}})
+            await writer.drain()
+
+        send({"done": True})
+    except Exception as e:
+        if debug:
+            rich_log.exception(e)
+        send({"error": str(e), "type": type(e).__name__})
+    finally:
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+async def remote_stream(cls: qq.Queryable, query: str, all_pages: bool = False, page: int = 0, **_):
+    """ Batches of a search done by a running `serve` """
+    path = config.get('socket', SOCKET_FILE)
+    # Errors of `serve` raised again
+    remote_errors = {e.__name__: e for e in (
+        NotImplementedError, AssertionError, ConnectionError,
+        qq.MissingCookiesError, qq.ExpiredCookiesError)}
+
+    try:
+        reader, writer = await asyncio.open_unix_connection(path, limit=STREAM_LIMIT)
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise ConnectionError(
+            f"No server listening on {path}, start one with `serve`")
+
+    try:
+        writer.write(json.dumps({
+            "cls": cls.__name__,
+            "query": query,
+            "all_pages": all_pages,
+            "page": page,
+        }).encode() + b"\n")
+        await writer.drain()
+
+        while line := await reader.readline():
+            message = json.loads(line)
+
+            if "error" in message:
+                raise remote_errors.get(message["type"], Exception)(message["error"])
+            if message.get("done"):
+                return
+
+            batch = message["batch"]
+            batch["entries"] = [qq.Entry(**e) for e in batch["entries"]]
+            yield batch
+
+        raise ConnectionError("Server closed the connection before the end")
+    finally:
+        writer.close()
+
+
+async def tryq_wrapper(cls_list, workers: int = 0, remote: bool = False, **kwargs):
+    # Neither a server nor the offline index need connections
+    if remote or kwargs.get("offline"):
+        await asyncio.gather(*(
+            asyncio.create_task(
+                try_queryable(cls=cls, remote=True, **kwargs), name=cls.__name__)
+            for cls in cls_list))
+        return
+
+    qq.start_workers(workers)
+
+    try:
+        async with qq.make_session(config.get('connector'), config.get('timeout')) as session:
+            tasks = []
+            for cls in cls_list:
+                task = asyncio.create_task(
+                    try_queryable(cls=cls, session=session, **kwargs),
+                    name=cls.__name__
+                )
+                tasks.append(task)
+
+            await asyncio.gather(*tasks)
+
+            # Catalogs refreshed in the background still need the session
+            await qq.wait_background()
+    finally:
+        qq.stop_workers()
+
+
+async def try_queryable(cls: qq.Queryable, debug: bool, status: Status, live: LiveTables = None, fmt: str = None, ranking: Ranking = None, **kwargs):
+    if not (isinstance(cls, type) and issubclass(cls, qq.Queryable)):
         print(f"{cls} is not a valid Queryable.", justify="center")
         return
 
     try:
         status.update(f"Starting {cls.NAME()}")
-        await run_queryable(cls=cls, status=status, **kwargs)
-    except (NotImplementedError, qq.MissingCookiesError, qq.ExpiredCookiesError) as e:
+        with qt.span(cls.__name__, "search"):
+            if ranking:
+                await rank_queryable(cls=cls, ranking=ranking, live=live, **kwargs)
+            elif fmt:
+                await write_queryable(cls=cls, fmt=fmt, **kwargs)
+            elif live:
+                await stream_queryable(cls=cls, live=live, **kwargs)
+            else:
+                await run_queryable(cls=cls, status=status, **kwargs)
+    except (NotImplementedError, ConnectionError, qq.MissingCookiesError, qq.ExpiredCookiesError) as e:
         if debug:
             logging.error(e)
         else:
@@ -143,14 +591,26 @@ async def try_queryable(cls: Queryable, debug: bool, status: Status, **kwargs):
         else:
             print(f"{cls.NAME()} - Error: {e}", justify="center")
 
-    if not debug:
+    if not debug and not live and not fmt and not ranking:
         print("\n" * 2)
 
 
-async def run_queryable(cls: Queryable, status: Status, **kwargs):
+def request_stream(cls: qq.Queryable, remote: bool = False, offline: bool = False, **kwargs):
+    """ Batches of cls with its config options, until its deadline """
+    if offline:
+        return qo.search_stream(cls, **kwargs)
+    if remote:
+        return remote_stream(cls, **kwargs)
+
+    options = {**kwargs, **config.get(cls.__name__, {})}
+    deadline = options.pop("deadline", config.get("deadline"))
+    return qq.until_deadline(cls.stream_request(**options), deadline)
+
+
+async def run_queryable(cls: qq.Queryable, status: Status, **kwargs):
 
     status.update(f"[status]Requesting {cls.NAME()} data...")
-    data = await cls.make_request(**{**kwargs, **config.get(cls.__name__, {})})
+    data = await qq.collect_stream(request_stream(cls, **kwargs))
 
     assert isinstance(data, dict), "make_request() didn't return data dict."
 
@@ -159,7 +619,6 @@ async def run_queryable(cls: Queryable, status: Status, **kwargs):
     assert isinstance(data.get("entries"), list), (
         "make_request() didn't return a valid list of entries.")
 
-    cls.log(logging.debug, f"{data['entries'] = }")
     cls.log(logging.info, f"{len(data['entries']) = }")
     cls.log(logging.info,
             f"data = {(lambda d: (d.pop('entries') or True) and d)(data.copy())}")
@@ -167,27 +626,96 @@ async def run_queryable(cls: Queryable, status: Status, **kwargs):
     assert data["entries"], "0 entries found."
 
     status.update(f"[status]Parsing {cls.NAME()} data...")
-    data = cls.parse_data(data)
+    with qt.span(cls.__name__, "parse_data"):
+        data = cls.parse_data(data)
 
     assert data["entries"], "every entry was removed during parsing of data."
 
-    cls.log(logging.debug, f"parsed {data['entries'] = }")
-
     status.update(f"[status]Creating table for {cls.NAME()}...")
-    table = cls.make_table(data)
+    with qt.span(cls.__name__, "make_table"):
+        table = cls.make_table(data)
     status.update("[status]Awaiting for " + ", ".join(
-        [queryables_dict[t.get_name()].NAME()
+        [get_queryable(t.get_name()).NAME()
          for t in asyncio.all_tasks()
-         if t.get_name() in queryables_dict
+         if t.get_name() in QUERYABLES
          ]) + " data...")
 
     assert table.row_count, "constructed table with no rows"
 
-    print(table, justify="center")
+    with qt.span(cls.__name__, "render"):
+        print(table, justify="center")
+
+
+async def rank_queryable(cls: qq.Queryable, ranking: Ranking, live: LiveTables = None, **kwargs):
+    """ Pushes each batch into the ranking as it arrives """
+    received = 0
+    ranking.names[cls.__name__] = cls.NAME()
+
+    async for batch in request_stream(cls, **kwargs):
+        with qt.span(cls.__name__, "parse_data"):
+            entries = cls.parse_data(batch)["entries"]
+        with qt.span(cls.__name__, "rank"):
+            ranking.push(cls.__name__, entries)
+        received += len(entries)
+
+        if live and ranking.total:
+            with qt.span(cls.__name__, "render"):
+                live.update(ranking, ranking.make_table())
+
+    assert received, "0 entries found."
+
+
+async def write_queryable(cls: qq.Queryable, fmt: str, **kwargs):
+    """ Writes the entries of cls when it finishes, without a table """
+    data = await qq.collect_stream(request_stream(cls, **kwargs))
+
+    assert data and data["entries"], "0 entries found."
+
+    with qt.span(cls.__name__, "parse_data"):
+        entries = cls.parse_data(data)["entries"]
+    with qt.span(cls.__name__, "render"):
+        write_entries(fmt, cls.__name__, entries)
+
+
+async def stream_queryable(cls: qq.Queryable, live: LiveTables, **kwargs):
+    """
+    Parses each batch as it arrives, so only parsed entries are kept. The
+    table is redrawn every REDRAW_SECONDS at most, and once at the end
+    """
+    def redraw():
+        with qt.span(cls.__name__, "make_table"):
+            table = cls.make_table(data)
+        with qt.span(cls.__name__, "render"):
+            live.update(cls, table)
+
+    data = None
+    drawn = None
+    pending = False
+
+    async for batch in request_stream(cls, **kwargs):
+        assert isinstance(batch, dict), "stream_request() didn't yield data dict."
+
+        assert isinstance(batch.get("entries"), list), (
+            "stream_request() didn't yield a valid list of entries.")
+
+        cls.log(logging.info, f"batch of {len(batch['entries'])} entries")
+
+        with qt.span(cls.__name__, "parse_data"):
+            data = qq.merge_batch(data, cls.parse_data(batch))
+
+        pending = bool(data["entries"])
+        if pending and (drawn is None or perf_counter() - drawn >= REDRAW_SECONDS):
+            redraw()
+            drawn = perf_counter()
+            pending = False
+
+    if pending:
+        redraw()
+
+    assert data and data["entries"], "0 entries found."
 
 
 if __name__ == "__main__":
     logging.basicConfig(datefmt="[%X]",
-                        handlers=[RichHandler(rich_tracebacks=True)])
-    traceback.install()
+                        handlers=[RichHandler(rich_tracebacks=True, console=Console(stderr=True))])
     app()
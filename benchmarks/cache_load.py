@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Milliseconds for a new process to open the cached Info_Anime catalog and
+its index and to search a title, at 10000 and 100000 titles, with the
+cache in JSON and in columnar files (cache_format "columnar"). The best
+of repeat runs, the files being in the OS page cache after the first.
+
+    python benchmarks/cache_load.py [repeat]
+"""
+
+import sys
+import json
+import datetime
+import tempfile
+import subprocess
+from os.path import dirname, realpath
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+import queryables.queryable as qq  # noqa: E402
+from queryables.info_anime import Info_Anime  # noqa: E402
+from queryables.index import build_index  # noqa: E402
+
+ROOT = dirname(dirname(realpath(__file__)))
+FIXTURE = dirname(realpath(__file__)) + "/fixtures/info_anime_listageral.html"
+SIZES = (10000, 100000)
+FORMATS = ("json", "columnar")
+QUERY = "shingeki"
+
+# Run in a new process, printing the milliseconds of each step as JSON
+SEARCH = f"""
+import sys, json
+from time import perf_counter
+start = perf_counter()
+sys.path.insert(0, {ROOT!r})
+import queryables.queryable as qq
+from queryables.info_anime import Info_Anime
+from queryables.index import search_index
+qq.CACHE_DB = sys.argv[1]
+imported = perf_counter()
+
+links = Info_Anime.read_cache("all", float("inf"))
+index = Info_Anime.catalog_index(qq.columnar.column(links, 0))
+opened = perf_counter()
+
+matches = search_index(index, {QUERY!r})
+entries = [links[i] for i in matches[:30]]
+searched = perf_counter()
+
+print(json.dumps({{"import_ms": (imported - start) * 1000, "open_ms": (opened - imported) * 1000,
+                  "search_ms": (searched - opened) * 1000, "matches": len(matches)}}))
+"""
+
+
+def make_catalog(titles: int) -> list[list[str]]:
+    """ The fixture's titles repeated, the repeated ones numbered """
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        links = Info_Anime.parse_page(f.read())["entries"]
+    return [[f"{links[i % len(links)][0]} #{i // len(links)}" if i >= len(links) else links[i][0],
+             links[i % len(links)][1]] for i in range(titles)]
+
+
+def write_cache(path: str, fmt: str, catalog: list):
+    qq.CACHE_DB = path
+    qq.cache_format = fmt
+    qq.open_cache(force=True)
+    time = datetime.datetime.today().isoformat()
+    qq.save_cache("Info_Anime", "all", time, catalog)
+    qq.save_cache("Info_Anime", "index", time, build_index([title for title, _ in catalog]))
+
+
+def load(path: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", SEARCH, path], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def main(number: int = 5):
+    print(f"{'titles':>8} {'format':>9} {'open ms':>9} {'search ms':>10} {'total ms':>9} {'import ms':>10}")
+
+    for titles in SIZES:
+        catalog = make_catalog(titles)
+
+        for fmt in FORMATS:
+            with tempfile.TemporaryDirectory() as tmp:
+                write_cache(tmp + "/cache.sqlite3", fmt, catalog)
+                best = min((load(tmp + "/cache.sqlite3") for _ in range(number)),
+                           key=lambda r: r["open_ms"] + r["search_ms"])
+
+            print(f"{titles:>8} {fmt:>9} {best['open_ms']:9.1f} {best['search_ms']:10.1f} "
+                  f"{best['open_ms'] + best['search_ms']:9.1f} {best['import_ms']:10.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
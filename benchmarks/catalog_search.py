@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Milliseconds to search a catalog index with exact, accent-insensitive and
+fuzzy queries, on titles generated like the AnimeNSK packs and Info Anime
+ones.
+
+    python benchmarks/catalog_search.py [titles] [repeat]
+"""
+
+import sys
+import random
+from os.path import dirname, realpath
+from time import perf_counter
+from timeit import repeat
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from queryables.index import build_index, search_index  # noqa: E402
+
+WORDS = ["shingeki", "no", "kyoujin", "boku", "hero", "academia", "kimetsu",
+         "yaiba", "ação", "coração", "mushishi", "naruto", "shippuuden",
+         "one", "piece", "re", "zero", "kara", "hajimeru", "isekai",
+         "seikatsu", "sword", "art", "online", "fullmetal", "alchemist"]
+GROUPS = ["Grp", "OldAge", "Tenrou", "HorribleSubs", "AnimeNSK"]
+QUERIES = ["shingeki no kyoujin", "coracao", "shingeki no kyojin", "re zero kara"]
+
+
+def titles(n: int) -> list[str]:
+    random.seed(0)
+    return [f"[{random.choice(GROUPS)}] "
+            + " ".join(random.sample(WORDS, random.randint(2, 5)))
+            + f" - {i % 1000:03} [720p].mkv" for i in range(n)]
+
+
+def main(n: int = 50000, number: int = 5):
+    catalog = titles(n)
+
+    start = perf_counter()
+    index = build_index(catalog)
+    print(f"build_index: {(perf_counter() - start) * 1000:8.1f} ms for {n} titles")
+
+    for query in QUERIES:
+        best = min(repeat(lambda: search_index(index, query), number=1, repeat=number))
+        print(f"{query!r:>22}: {best * 1000:8.1f} ms, {len(search_index(index, query))} matches")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
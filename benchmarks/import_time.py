@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Milliseconds to start the CLI for --help and to import a single queryable,
+with the slowest modules imported, as reported by python -X importtime.
+
+    python benchmarks/import_time.py [top] [repeat]
+"""
+
+import sys
+import subprocess
+from os.path import dirname, realpath
+from time import perf_counter
+
+ROOT = dirname(dirname(realpath(__file__)))
+CASES = {
+    "--help": [f"{ROOT}/ani-search.py", "--help"],
+    "Uniotaku": ["-c", "import queryables; queryables.get_queryable('Uniotaku')"],
+}
+
+
+def import_times(args: list[str]) -> tuple[float, dict[str, int], int]:
+    """
+    Wall seconds, the cumulative microseconds of each module and of all
+    the imports
+    """
+    start = perf_counter()
+    stderr = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                            capture_output=True, text=True).stderr
+    wall = perf_counter() - start
+
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        modules[name.strip()] = int(cumulative)
+        # Nested imports are indented, and already in their parent's time
+        if name[1] != " ":
+            total += int(cumulative)
+
+    return wall, modules, total
+
+
+def main(top: int = 5, number: int = 3):
+    for case, args in CASES.items():
+        wall, modules, total = min((import_times(args) for _ in range(number)),
+                                   key=lambda r: r[0])
+        print(f"{case:>10}: {wall * 1000:7.1f} ms wall, {total / 1000:7.1f} ms importing")
+
+        slowest = sorted(modules.items(), key=lambda m: m[1], reverse=True)[:top]
+        for name, t in slowest:
+            print(f"{'':12}{t / 1000:7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
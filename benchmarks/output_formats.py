@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Rows per second written by each --format against building and rendering
+the rich table, on Uniotaku entries parsed from a recorded payload.
+
+    python benchmarks/output_formats.py [rows] [repeat]
+"""
+
+import sys
+import io
+import json
+from os.path import dirname, realpath
+from timeit import repeat
+
+from rich.console import Console
+from rich.theme import Theme
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from queryables.uniotaku import Uniotaku  # noqa: E402
+from queryables.formats import WRITERS, BINARY_FORMATS, missing_dependency  # noqa: E402
+
+FIXTURE = dirname(realpath(__file__)) + "/fixtures/uniotaku_torrents.json"
+# The styles tables use, from ani-search.py
+THEME = Theme({s: "bold" for s in (
+    "movie", "special", "nsfw", "episodes", "complete", "title_style", "header_style")})
+
+
+def render_table(entries: list[dict]):
+    data = {"entries": entries, "total": len(entries), "showing": len(entries)}
+    console = Console(file=io.StringIO(), width=160, theme=THEME)
+    console.print(Uniotaku.make_table(data), justify="center")
+
+
+def main(rows: int = 5000, number: int = 3):
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        data = json.load(f)["data"]
+
+    entries = Uniotaku.parse_entries((data * (rows // len(data) + 1))[:rows])
+
+    results = {"table": min(repeat(lambda: render_table(entries), number=1, repeat=number))}
+
+    for fmt, write in WRITERS.items():
+        if missing_dependency(fmt):
+            print(f"{fmt}: skipped, {missing_dependency(fmt)}")
+            continue
+
+        def run():
+            out = io.BytesIO() if fmt in BINARY_FORMATS else io.StringIO()
+            write("Uniotaku", entries, out)
+
+        results[fmt] = min(repeat(run, number=1, repeat=number))
+
+    for fmt, t in results.items():
+        print(f"{fmt:8} {rows / t:>12,.0f} rows/s "
+              f"({results['table'] / t:.1f}x table)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
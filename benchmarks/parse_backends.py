@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Parse time of the recorded AnimeNSK packs page: the previous full
+html.parser soup, then extract() with every installed backend.
+
+    python benchmarks/parse_backends.py [rows] [repeat]
+"""
+
+import sys
+import re
+from os.path import dirname, realpath
+from timeit import repeat
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+import queryables.queryable as qq  # noqa: E402
+
+FIXTURE = dirname(realpath(__file__)) + "/fixtures/animensk_packs.html"
+
+
+def scaled_page(rows: int) -> str:
+    """ The recorded page with its rows repeated until there are enough """
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        page = f.read()
+
+    head, recorded, tail = re.split(r"<!-- /?rows -->", page)
+    recorded = recorded.strip().split("\n<tr")
+    recorded = recorded[:1] + ["<tr" + tr for tr in recorded[1:]]
+    repeated = (recorded * (rows // len(recorded) + 1))[:rows]
+    return head + "\n".join(repeated) + tail
+
+
+def main(rows: int = 5000, times: int = 3):
+    page = scaled_page(rows)
+    print(f"{rows} rows, {len(page) / 1024:.0f} KiB")
+
+    def full_soup():
+        soup = BeautifulSoup(page, "html.parser")
+        trs = soup.find_all("tr", class_=re.compile(r"^L1$"))
+        return [[td.get_text() for td in tr.find_all("td")] for tr in trs]
+
+    def extracted():
+        trs = qq.extract(page, "tr", {"class": "L1"}, cell="td")
+        return [[td.string for td in tr.cells] for tr in trs]
+
+    cases = [("full html.parser soup", full_soup)]
+    for backend in ("html.parser", "lxml"):
+        if backend == "html.parser" or qq.lxml_html is not None:
+            cases.append((f"extract() with {backend}", extracted, backend))
+
+    expected = full_soup()
+    for name, func, *backend in cases:
+        qq.html_parser = (backend or ["html.parser"])[0]
+        assert func() == expected, f"{name} parsed different rows"
+
+        best = min(repeat(func, number=1, repeat=times))
+        print(f"{name:>26}: {best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
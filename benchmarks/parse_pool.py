@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Pages per second parsed in the event loop against a pool of worker
+processes, on recorded pages of every paginated site, all at once.
+
+    python benchmarks/parse_pool.py [pages per site] [workers]
+"""
+
+import sys
+import os
+import asyncio
+from os.path import dirname, realpath
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+import queryables.queryable as qq  # noqa: E402
+from queryables.mdan import MDAN  # noqa: E402
+from queryables.animeNSK import AnimeNSK_Torrent, AnimeNSK_Packs  # noqa: E402
+from queryables.uniotaku import Uniotaku  # noqa: E402
+
+FIXTURES = dirname(realpath(__file__)) + "/fixtures/"
+PAGES = {
+    MDAN: "mdan_browse.html",
+    AnimeNSK_Torrent: "animensk_torrent.html",
+    AnimeNSK_Packs: "animensk_packs.html",
+    Uniotaku: "uniotaku_torrents.json",
+}
+
+
+async def parse_all(pages: list) -> float:
+    start = perf_counter()
+    await asyncio.gather(*[qq.run_parser(cls.parse_page, content)
+                           for cls, content in pages])
+    return perf_counter() - start
+
+
+def main(per_site: int = 40, workers: int = os.cpu_count()):
+    pages = []
+    for cls, fixture in PAGES.items():
+        with open(FIXTURES + fixture, "rb") as f:
+            pages += [(cls, f.read())] * per_site
+
+    print(f"{len(pages)} pages, {workers} workers, {qq.html_parser}")
+
+    inline = asyncio.run(parse_all(pages))
+    print(f"{'event loop':>12}: {len(pages) / inline:8.1f} pages/s")
+
+    qq.start_workers(workers)
+    try:
+        asyncio.run(parse_all(pages[:workers]))  # Warm up the processes
+        pooled = asyncio.run(parse_all(pages))
+    finally:
+        qq.stop_workers()
+    print(f"{'pool':>12}: {len(pages) / pooled:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Milliseconds and peak memory of a whole search of every queryable, from
+make_request() to the rendered table, at 30, 1000 and 10000 entries,
+against the fixtures served by benchmarks/standin.py.
+
+Stages: fetch (make_request() waiting on the server), parse_page,
+parse_data, make_table and render, of the fastest of a few runs. The
+results are written as JSON to results.json (stdout by default), then
+compared with baseline.json, the results of an earlier run, when given.
+
+    python benchmarks/pipeline.py [results.json] [baseline.json]
+"""
+
+import sys
+import io
+import json
+import socket
+import asyncio
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from os.path import dirname, realpath
+from time import perf_counter, sleep
+
+from rich.console import Console
+from rich.theme import Theme
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+import queryables  # noqa: E402
+import queryables.queryable as qq  # noqa: E402
+
+STANDIN = dirname(realpath(__file__)) + "/standin.py"
+# Entries of each search, and the best of how many runs is kept
+SIZES = {30: 5, 1000: 3, 10000: 1}
+STAGES = ("fetch", "parse_page", "parse_data", "make_table", "render")
+# Results this much slower than the baseline are flagged
+REGRESSION = 1.1
+# The stand-in is local, there's nothing to be polite to
+REQUEST_OPTIONS = {
+    "rate_limit": {"rate": 1e9, "burst": 1e9},
+    "cookies": {"uid": "1", "pass": "x", "hashv": "x"},
+    "cache_hour_limit": 0,
+    # Whole catalogs, as in a first search, not only their new rows
+    "incremental_refresh": False,
+    # Every run requests its pages, none reused from the previous one
+    "response_cache_seconds": 0,
+}
+# The styles tables use, from ani-search.py
+THEME = Theme({s: "bold" for s in (
+    "movie", "special", "nsfw", "episodes", "complete", "title_style", "header_style")})
+
+# Seconds spent in each stage by the running search
+stages = dict.fromkeys(STAGES, 0.0)
+
+
+def timed_parse_page(parse_page):
+    def wrapper(*args):
+        start = perf_counter()
+        try:
+            return parse_page(*args)
+        finally:
+            stages["parse_page"] += perf_counter() - start
+    return wrapper
+
+
+def start_standin() -> tuple[subprocess.Popen, int]:
+    """ The stand-in in its own process, not to share this event loop """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = subprocess.Popen([sys.executable, STANDIN, str(port)])
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return server, port
+        except OSError:
+            sleep(0.1)
+
+    server.kill()
+    raise RuntimeError("The stand-in server didn't start")
+
+
+async def search(cls: qq.Queryable, entries: int) -> float:
+    """ Seconds of a whole search of entries, each stage's added to stages """
+    stages.update(dict.fromkeys(STAGES, 0.0))
+    console = Console(file=io.StringIO(), width=160, theme=THEME)
+
+    async with qq.make_session() as session:
+        start = perf_counter()
+        data = await cls.make_request(query="", session=session, length=entries,
+                                      **REQUEST_OPTIONS)
+        stages["fetch"] = perf_counter() - start - stages["parse_page"]
+
+        lap = perf_counter()
+        data = cls.parse_data(data)
+        stages["parse_data"] = perf_counter() - lap
+
+        lap = perf_counter()
+        table = cls.make_table(data)
+        stages["make_table"] = perf_counter() - lap
+
+        lap = perf_counter()
+        console.print(table, justify="center")
+        stages["render"] = perf_counter() - lap
+
+    assert len(data["entries"]) == entries, \
+        f"{cls.__name__}: {len(data['entries'])} of {entries} entries"
+    return perf_counter() - start
+
+
+def measure(cls: qq.Queryable, entries: int, number: int) -> dict:
+    best = None
+    for _ in range(number):
+        total = asyncio.run(search(cls, entries))
+        if best is None or total < best["total_ms"] / 1000:
+            best = {"total_ms": total * 1000,
+                    **{f"{s}_ms": t * 1000 for s, t in stages.items()}}
+
+    # Traced apart, tracemalloc slows everything down
+    tracemalloc.start()
+    asyncio.run(search(cls, entries))
+    best["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return {k: round(v, 2) for k, v in best.items()}
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\n{'':18}{'entries':>8} {'total ms':>10} {'baseline':>10} "
+          f"{'peak KiB':>10} {'baseline':>10}", file=sys.stderr)
+
+    for name, sizes in results["results"].items():
+        for size, r in sizes.items():
+            old = baseline["results"].get(name, {}).get(size)
+            if not old:
+                continue
+            slower = [k for k in ("total_ms", "peak_kib") if r[k] > old[k] * REGRESSION]
+            print(f"{name:>18}{size:>8} {r['total_ms']:10.1f} {old['total_ms']:10.1f} "
+                  f"{r['peak_kib']:10.0f} {old['peak_kib']:10.0f}"
+                  + (f"  regressed: {', '.join(slower)}" if slower else ""), file=sys.stderr)
+
+
+def main(out: str = None, baseline: str = None, sizes: dict = SIZES):
+    results = {
+        "python": platform.python_version(),
+        "html_parser": qq.html_parser,
+        "results": {},
+    }
+
+    server, port = start_standin()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Catalogs are fetched every time, into a cache of their own
+            qq.CACHE_DB = tmp + "/cache.sqlite3"
+            qq.CACHE_FILE = tmp + "/cache.json"
+
+            for name in queryables.QUERYABLES:
+                cls = queryables.get_queryable(name)
+                cls.parse_page = timed_parse_page(cls.parse_page)
+                results["results"][name] = {}
+
+                for entries, number in sizes.items():
+                    cls.END_POINT = f"http://127.0.0.1:{port}/{entries}/{name.lower()}/"
+                    r = measure(cls, entries, number)
+                    results["results"][name][str(entries)] = {"repeat": number, **r}
+
+                    print(f"{name:>18}{entries:>8}: {r['total_ms']:9.1f} ms, {r['peak_kib']:9.0f} KiB peak  ("
+                          + ", ".join(f"{s} {r[s + '_ms']:.1f}" for s in STAGES) + ")",
+                          file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
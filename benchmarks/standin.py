@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+A local stand-in for every site, answering with the recorded fixtures
+repeated up to any number of entries. The number is the first part of
+the path, so each queryable's END_POINT is http://host:port/<entries>/<site>/
+
+    python benchmarks/standin.py [port]
+"""
+
+import sys
+import re
+import json
+from math import ceil
+from os.path import dirname, realpath
+from functools import lru_cache
+
+from aiohttp import web
+
+FIXTURES = dirname(realpath(__file__)) + "/fixtures/"
+PORT = 8765
+# Entries in each page of the paginated sites, and the most Uniotaku gives
+MDAN_PAGE_LENGTH = 30
+ANSK_PAGE_LENGTH = 15
+UNIOTAKU_MAX_LENGTH = 1000
+
+
+def read_fixture(name: str) -> str:
+    with open(FIXTURES + name, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@lru_cache
+def split_rows(name: str, row: str) -> tuple[str, list[str], str]:
+    """ The fixture before its first row, every row and after its last """
+    content = read_fixture(name)
+    rows = re.findall(row, content, re.S)
+    head = content[:content.index(rows[0])]
+    tail = content[content.rindex(rows[-1]) + len(rows[-1]):]
+    return head, rows, tail
+
+
+def repeat_rows(rows: list[str], start: int, end: int) -> str:
+    return "\n".join(rows[i % len(rows)] for i in range(start, end))
+
+
+def page_range(request: web.Request, page_length: int) -> tuple[int, int, int]:
+    """ Entries of the whole search, then where the asked page starts and ends """
+    total = int(request.match_info["entries"])
+    page = int(request.query.get("page", 0))
+    return total, page, min(total, (page + 1) * page_length)
+
+
+async def mdan(request: web.Request) -> web.Response:
+    head, rows, tail = split_rows("mdan_browse.html", r'<tr class="browse_color">.*?</tr>')
+    total, page, end = page_range(request, MDAN_PAGE_LENGTH)
+
+    pagers = "".join(
+        f'<td class="highlight">{p + 1}</td>' if p == page else
+        f'<td><a href="browse.php?search=x&amp;page={p}" '
+        f'title="{p * MDAN_PAGE_LENGTH + 1}-{min(total, (p + 1) * MDAN_PAGE_LENGTH)}">{p + 1}</a></td>'
+        for p in range(ceil(total / MDAN_PAGE_LENGTH)))
+    head = re.sub(r'(<table class="main" align="center"><tr>).*?(</tr></table>)',
+                  lambda m: m[1] + pagers + m[2], head, flags=re.S)
+
+    body = head + repeat_rows(rows, page * MDAN_PAGE_LENGTH, end) + tail
+    return web.Response(text=body, content_type="text/html")
+
+
+async def animensk_torrent(request: web.Request) -> web.Response:
+    head, rows, tail = split_rows("animensk_torrent.html", r'<tr id="trTorrentRow">.*?</tr>')
+    total, page, end = page_range(request, ANSK_PAGE_LENGTH)
+
+    def pager_range(p): return f"{p * ANSK_PAGE_LENGTH + 1}-{min(total, (p + 1) * ANSK_PAGE_LENGTH)}"
+
+    pagers = " ".join(
+        f'<font class="gray">{pager_range(p)}</font>' if p == page else
+        f'<a href="?search=x&amp;page={p}">{pager_range(p)}</a>'
+        for p in range(ceil(total / ANSK_PAGE_LENGTH)))
+    head = re.sub(r'(<span class="pager">).*?(</span>)',
+                  lambda m: m[1] + pagers + m[2], head, flags=re.S)
+
+    body = head + repeat_rows(rows, page * ANSK_PAGE_LENGTH, end) + tail
+    return web.Response(text=body, content_type="text/html")
+
+
+async def animensk_packs(request: web.Request) -> web.Response:
+    head, rows, tail = split_rows("animensk_packs.html", r'<tr class="L1".*?</tr>')
+    total = int(request.match_info["entries"])
+    listing = [rows[i % len(rows)] for i in range(total)]
+
+    # The listing of a single bot has only its packs
+    bot = request.query.get("bot", "Todos")
+    if bot != "Todos":
+        listing = [row for row in listing if f"/msg {bot} " in row]
+
+    return web.Response(text=head + "\n".join(listing) + tail, content_type="text/html")
+
+
+async def info_anime(request: web.Request) -> web.Response:
+    head, rows, tail = split_rows("info_anime_listageral.html", r"<li><a href=\"dados.*?</li>")
+    total = int(request.match_info["entries"])
+    # Titles are the keys of the catalog, so the repeated ones are numbered
+    body = "\n".join(rows[i % len(rows)].replace("</a>", f" #{i // len(rows)}</a>")
+                     if i >= len(rows) else rows[i] for i in range(total))
+    return web.Response(text=head + body + tail, content_type="text/html")
+
+
+async def uniotaku(request: web.Request) -> web.Response:
+    data = json.loads(read_fixture("uniotaku_torrents.json"))
+    total = int(request.match_info["entries"])
+    start = int(request.query.get("start", 0))
+    end = min(total, start + min(UNIOTAKU_MAX_LENGTH, int(request.query.get("length", 30))))
+
+    rows = data["data"]
+    data.update(recordsTotal=total, recordsFiltered=total,
+                data=[rows[i % len(rows)] for i in range(start, end)])
+    return web.json_response(data)
+
+
+def make_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get(r"/{entries:\d+}/mdan/browse.php", mdan)
+    app.router.add_get(r"/{entries:\d+}/animensk_torrent/browse.php", animensk_torrent)
+    app.router.add_get(r"/{entries:\d+}/animensk_packs/index.php", animensk_packs)
+    app.router.add_get(r"/{entries:\d+}/uniotaku/torrents_.php", uniotaku)
+    # Info_Anime asks for END_POINT + "/listageral"
+    app.router.add_get(r"/{entries:\d+}/info_anime/{_:/?}listageral", info_anime)
+    return app
+
+
+def serve(port: int = PORT):
+    web.run_app(make_app(), host="127.0.0.1", port=port, print=None)
+
+
+if __name__ == "__main__":
+    serve(*map(int, sys.argv[1:2]))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Rows per second of Uniotaku.parse_entries() on a recorded torrents_.php
+payload, against the previous parser that built a soup for every cell.
+
+    python benchmarks/uniotaku_parse.py [rows] [repeat]
+"""
+
+import sys
+import json
+from os.path import dirname, realpath
+from timeit import repeat
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from queryables.queryable import Entry, as_bytes, get_tag, get_attr, get_body, get_href  # noqa: E402
+from queryables.uniotaku import Uniotaku, MAX_LENGTH  # noqa: E402
+
+FIXTURE = dirname(realpath(__file__)) + "/fixtures/uniotaku_torrents.json"
+
+
+def parse_entries_per_cell(entries: list) -> list[Entry]:
+    """ The previous parser, one BeautifulSoup per html cell """
+    new_entries = []
+    for cell in entries:
+        torrent = get_tag(cell[0], "a")
+        coin = get_tag(cell[0], "img")
+        _type = get_attr(get_tag(cell[1], "img"), "alt")
+        if _type == "Anime Completo":
+            _type = "Completo"
+        if _type == "Anime":
+            _type = "Episodios"
+        external_link = get_tag(cell[2], "a")
+        group = get_tag(cell[7], "a")
+        uploader = get_tag(cell[8], "a")
+
+        new_entries.append(Entry(
+            title=get_body(torrent),
+            page=Uniotaku.END_POINT + get_href(torrent),
+            type=_type,
+            seeds=int(cell[3] or 0),
+            leechers=int(cell[4] or 0),
+            completions=int(cell[5] or 0),
+            size=as_bytes(cell[6]),
+            uploader=get_body(uploader),
+            extras={
+                "coin": get_attr(coin, "title"),
+                "external_link": get_href(external_link),
+                "group_name": get_body(group),
+                "group_link": get_href(group),
+                "uploader_link": Uniotaku.END_POINT + get_href(uploader),
+            },
+        ))
+    return new_entries
+
+
+def main(rows: int = MAX_LENGTH, times: int = 5):
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        recorded = json.load(f)["data"]
+
+    entries = (recorded * (rows // len(recorded) + 1))[:rows]
+
+    assert parse_entries_per_cell(entries) == Uniotaku.parse_entries(entries)
+
+    for name, func in (("before (soup per cell)", parse_entries_per_cell),
+                       ("after (fragment parser)", Uniotaku.parse_entries)):
+        best = min(repeat(lambda: func(entries), number=1, repeat=times))
+        print(f"{name:>24}: {rows / best:10.0f} rows/s ({best * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
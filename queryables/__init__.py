@@ -1,14 +1,47 @@
-from queryables.queryable import Queryable
-
-from queryables.info_anime import Info_Anime
-from queryables.animeNSK import AnimeNSK_Packs, AnimeNSK_Torrent
-from queryables.uniotaku import Uniotaku
-from queryables.mdan import MDAN
-
+import sys
 from enum import Enum
+from importlib import import_module
+from importlib.util import LazyLoader, find_spec, module_from_spec
+
+# Every queryable by name, with the module it's in. Modules are only
+# imported when one of their queryables is used
+QUERYABLES = {
+    "Info_Anime": "queryables.info_anime",
+    "AnimeNSK_Packs": "queryables.animeNSK",
+    "AnimeNSK_Torrent": "queryables.animeNSK",
+    "Uniotaku": "queryables.uniotaku",
+    "MDAN": "queryables.mdan",
+}
 
-queryables_list = (Info_Anime, AnimeNSK_Packs,
-                   AnimeNSK_Torrent, Uniotaku, MDAN)
-queryables_dict = {q.__name__: q for q in queryables_list}
 queryables_enum = Enum(
-    'Queryables', {str(i): q.__name__ for i, q in enumerate(queryables_list)})
+    'Queryables', {str(i): name for i, name in enumerate(QUERYABLES)})
+
+
+def lazy_import(name: str):
+    """ A module which is only executed when one of its attributes is used """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = find_spec(name)
+    spec.loader = LazyLoader(spec.loader)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_queryable(name: str):
+    return getattr(import_module(QUERYABLES[name]), name)
+
+
+def __getattr__(name: str):
+    """ Imports every queryable module only when the lists are used """
+    if name == "queryables_list":
+        return tuple(get_queryable(q) for q in QUERYABLES)
+    if name == "queryables_dict":
+        return {q: get_queryable(q) for q in QUERYABLES}
+    if name in QUERYABLES:
+        return get_queryable(name)
+    if name == "Queryable":
+        return import_module("queryables.queryable").Queryable
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
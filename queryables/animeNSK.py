@@ -1,43 +1,49 @@
+from __future__ import annotations
 from queryables.queryable import *
-from queryables.queryable import _make_php_request
+from queryables.queryable import _stream_php_request
+
+# The number of a pack, in the first cell of its row
+PACK_ROW = re.compile(r'<tr class="L1"[^>]*>\s*<td[^>]*>\s*#?(\d+)')
 
 
 class AnimeNSK_Packs(Queryable):
 
     END_POINT = "https://packs.ansktracker.net/"
+    # Hours between refreshes of the whole listing, the others only merge new packs
+    FULL_REFRESH_HOURS = 24
 
     @classmethod
     async def make_request(cls, query: str, session: aiohttp.ClientSession, all_pages=False, page=0, length=30, **kwargs) -> dict:
-        entries = cls.read_cache("entries") or []
         start = page * length
 
-        if not entries:
-            url = cls.END_POINT + "index.php"
-            params = {"Modo": "Packs", "bot": "Todos",
-                      **kwargs.get("params", {})}
-
-            async with session.get(url=url, params=params) as res:
-                cls.log_response(res)
-
-                content = (res.ok and await res.text()) or ""
-                soup = BeautifulSoup(content, 'html.parser')
-                trs = soup.find_all("tr", class_=re.compile(r"^L1$"))
+        url = cls.END_POINT + "index.php"
+        params = {"Modo": "Packs", "bot": "Todos",
+                  **kwargs.get("params", {})}
 
-                entries = cls.parse_entries(trs)
-                cls.write_cache("entries", entries)
+        # Rows of cell texts: pack, gets, size, command and title
+        entries = await cls.cached_catalog(
+            "rows", session, url, params=params,
+            rate_limit=kwargs.get("rate_limit"),
+            timeout=kwargs.get("timeout"),
+            cache_hour_limit=kwargs.get("cache_hour_limit"),
+            stale_while_revalidate=kwargs.get("stale_while_revalidate"),
+            incremental_refresh=kwargs.get("incremental_refresh", True),
+            full_refresh_hours=kwargs.get("full_refresh_hours"))
 
         if query:
-            entries[:] = [e for e in entries if query in e["title"].lower()]
+            index = cls.catalog_index(columnar.column(entries, 4))
+            matches = search_index(index, query, kwargs.get("fuzzy", FUZZY))
+            total = len(matches)
+
+            matches = matches[start:] if all_pages else matches[start:start+length]
+            entries = [entries[i] for i in matches]
         else:
-            entries.sort(key=lambda e: as_int(e["pack_n"]), reverse=True)
-        total = len(entries)
+            # A new list, the cached catalog may be shared between searches
+            entries = sorted(entries, key=lambda e: as_int(e[0]), reverse=True)
+            total = len(entries)
+            entries = entries[start:] if all_pages else entries[start:start+length]
 
-        entries[:] = entries[start:] if all_pages else entries[start:start+length]
         showing = len(entries)
-
-        if query:
-            entries.sort(key=lambda e: e["title"].lower().find(query))
-
         remaining = max(0, total - (start + showing))
 
         return {
@@ -46,24 +52,166 @@ class AnimeNSK_Packs(Queryable):
             "showing": showing,
             "remaining": remaining,
             "total": total,
-            "parsed": True
         }
 
     @classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    async def _refresh_catalog(cls, key, session: aiohttp.ClientSession, url: str, params: dict = None,
+                               incremental_refresh=True, full_refresh_hours: float = None, **kwargs) -> list:
+        """
+        Packs only get higher numbers, so knowing the newest pack of each
+        bot, the listings of every bot are asked concurrently if they
+        changed, and only the rows of their new packs are parsed and
+        merged into the catalog and its index. The whole listing is
+        refreshed every FULL_REFRESH_HOURS, which also finds new bots
+        """
+        params = params or {}
+        marks = cls.read_cache("bots", float("inf"))
+        rows = cls.read_cache(key, float("inf"))
+
+        if full_refresh_hours is None:
+            full_refresh_hours = cls.FULL_REFRESH_HOURS
+        expired = marks is None or (datetime.datetime.today() - datetime.datetime.fromisoformat(
+            marks["full"])).total_seconds() >= full_refresh_hours * 60 * 60
+
+        if (expired or rows is None or not incremental_refresh or not marks["per_bot"]
+                or params.get("bot", "Todos") != "Todos"):
+            return await cls.full_refresh(key, session, url, params=params,
+                                          per_bot=expired or marks["per_bot"], **kwargs)
+
+        bots = list(marks["bots"])
+        results = await asyncio.gather(*(
+            cls.refresh_bot(session, url, bot, marks["bots"][bot], params={**params, "bot": bot}, **kwargs)
+            for bot in bots))
+
+        if None in results:
+            cls.log(logging.info, "Bot listings can't be used, refreshing the whole listing")
+            cls.write_cache("bots", {**marks, "per_bot": False})
+            return await cls.full_refresh(key, session, url, params=params, per_bot=False, **kwargs)
+
+        cls.write_cache("bots", {**marks, "bots": {bot: mark for bot, (mark, _, _) in zip(bots, results)}})
+
+        # Bots whose older packs changed have all their rows replaced
+        whole = {bot for bot, (_, _, w) in zip(bots, results) if w}
+        new = [row for _, bot_rows, w in results if not w for row in bot_rows]
+        replaced = [row for _, bot_rows, w in results if w for row in bot_rows]
+
+        if not new and not whole:
+            cache_stats["revalidated"] += 1
+            timings.count(cls.__name__, "revalidated")
+            cls.touch_cache(key, "index")
+            return rows
+
+        cache_stats["merged"] += 1
+        timings.count(cls.__name__, "merged")
+        cls.log(logging.info, f"Merging {len(new)} new packs, replacing the packs of {len(whole)} bots")
+
+        if whole:
+            catalog = [row for row in rows if cls.bot_of(row) not in whole] + replaced + new
+            cls.write_cache(key, catalog, drop=("index",))
+            return catalog
+
+        # Appended titles only extend the index, nothing is indexed again
+        catalog = list(rows) + new
+        index = cls.read_cache("index", float("inf"))
+        if index and index.get("version") == INDEX_VERSION and index["count"] == len(rows):
+            cls.write_cache(key, catalog)
+            cls.write_cache("index", extend_index(columnar.materialize(index), [row[4] for row in new]))
+        else:
+            cls.write_cache(key, catalog, drop=("index",))
 
-        new_entries = []
+        return catalog
 
-        for tag in entries:
-            tds = tag.find_all("td")
+    @classmethod
+    async def full_refresh(cls, key, session: aiohttp.ClientSession, url: str, per_bot=True, **kwargs) -> list:
+        """ The whole listing, as any catalog, and the newest pack of each bot in it """
+        rows = await super()._refresh_catalog(key, session, url, **kwargs)
+
+        bots = {}
+        for row in rows:
+            mark = bots.setdefault(cls.bot_of(row), {"pack": 0, "count": 0})
+            mark["pack"] = max(mark["pack"], as_int(row[0]))
+            mark["count"] += 1
+
+        cls.write_cache("bots", {"full": datetime.datetime.today().isoformat(),
+                                 "per_bot": per_bot, "bots": bots})
+        return rows
+
+    @classmethod
+    async def refresh_bot(cls, session: aiohttp.ClientSession, url: str, bot: str, mark: dict,
+                          **kwargs) -> tuple[dict, list, bool]:
+        """
+        The new mark of bot and the rows of its new packs, or of all its
+        packs when its older ones changed (and True). None when the site
+        doesn't list the packs of a single bot, listing those of others
+        """
+        headers = {}
+        if mark.get("etag"):
+            headers["If-None-Match"] = mark["etag"]
+        if mark.get("last_modified"):
+            headers["If-Modified-Since"] = mark["last_modified"]
+
+        res = await cls.fetch(session, url, headers=headers, **kwargs)
+        if res.status == 304:
+            return mark, [], False
+        # A failure says nothing of the bot listings, the refresh is only retried later
+        if not res.ok:
+            raise ConnectionError(f"{cls.NAME()} - Listing of {bot} failed: {res.reason} ({res.status})")
+
+        content = res.text()
+        listed = content.count('<tr class="L1"')
+        rows = (await run_parser(cls.parse_page, cls.newer_rows(content, mark["pack"])))["entries"]
+        rows = [row for row in rows if as_int(row[0]) > mark["pack"]]
+
+        # Removed or renumbered packs, the rows counted are all parsed instead
+        whole = listed != mark["count"] + len(rows)
+        if whole:
+            rows = (await run_parser(cls.parse_page, content))["entries"]
+
+        if any(cls.bot_of(row) != bot for row in rows):
+            return None
+
+        return {
+            "pack": max((as_int(row[0]) for row in rows), default=0 if whole else mark["pack"]),
+            "count": len(rows) if whole else mark["count"] + len(rows),
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+        }, rows, whole
 
-            new_entries.append({
-                "title": get_body(tds[4]),
-                "command": get_body(tds[3]),
-                "size": get_body(tds[2]),
-                "gets_n": get_body(tds[1]),
-                "pack_n": get_body(tds[0]),
-            })
+    @classmethod
+    def newer_rows(cls, content: str, pack: int) -> str:
+        """ content until the first row of a pack up to pack, listings being newest first """
+        for match in PACK_ROW.finditer(content):
+            if int(match[1]) <= pack:
+                return content[:match.start()]
+        return content
+
+    @classmethod
+    def bot_of(cls, row: list) -> str:
+        """ The bot of a row, from its command: /msg <bot> xdcc send #<pack> """
+        words = row[3].split()
+        return words[1] if len(words) > 1 else ""
+
+    @classmethod
+    def parse_page(cls, content) -> dict:
+        trs = extract(content, "tr", {"class": "L1"}, cell="td")
+        rows = [[get_body(td) for td in tr.cells] for tr in trs]
+        return {"entries": rows, "total": len(rows)}
+
+    @classmethod
+    def parse_entries(cls, entries: list) -> list[Entry]:
+
+        new_entries = []
+
+        for row in entries:
+            new_entries.append(Entry(
+                title=row[4],
+                size=as_bytes(row[2]),
+                completions=as_int(row[1]),
+                extras={
+                    "command": row[3],
+                    "pack": as_int(row[0]),
+                },
+            ))
 
         return new_entries
 
@@ -77,9 +225,9 @@ class AnimeNSK_Packs(Queryable):
 
         for cell in data['entries']:
             t.add_row(
-                cell['title'],
-                cell['size'],
-                cell['command'],
+                cell.title,
+                as_size(cell.size),
+                cell.extras['command'],
             )
 
         return t
@@ -88,56 +236,65 @@ class AnimeNSK_Packs(Queryable):
 class AnimeNSK_Torrent(Queryable):
 
     END_POINT = "https://www.ansktracker.net/"
+    RESPONSE_CACHE = True
+    SYNC = True
+    # The torrents table and the pagers
+    STRAINER = {"class_": ["teste", "pager"]}
 
     @classmethod
-    async def make_request(cls, query: str, **kwargs) -> dict:
+    async def make_request(cls, **kwargs) -> dict:
+        return await collect_stream(cls.stream_request(**kwargs))
 
-        def search_total(soup: BeautifulSoup, **_) -> int:
-            table = soup.find("span", class_=re.compile(r"^pager$"))
-            curr_pager = table and table.find(
-                "font", class_=re.compile(r"^gray$"))
+    @classmethod
+    def search_total(cls, soup: bs4.BeautifulSoup, trs: list[bs4.Tag]) -> int:
+        table = soup.find("span", class_=re.compile(r"^pager$"))
+        curr_pager = table and table.find(
+            "font", class_=re.compile(r"^gray$"))
 
-            if not table:
-                logging.info(
-                    "search_total() returning 0 - pagers table absent")
-                return 0
+        if not table:
+            logging.info(
+                "search_total() returning 0 - pagers table absent")
+            return 0
 
-            def total_of(tag): return int(get_body(tag).split("-")[1])
+        def total_of(tag): return int(get_body(tag).split("-")[1])
 
-            exp = re.compile(r"^\?.*page=(\d+).*")
-            pagers = table.find_all(href=exp)
-            pagers = pagers and list(
-                filter(lambda p: len(get_body(p).split("-")) == 2, pagers))
+        exp = re.compile(r"^\?.*page=(\d+).*")
+        pagers = table.find_all(href=exp)
+        pagers = pagers and list(
+            filter(lambda p: len(get_body(p).split("-")) == 2, pagers))
 
-            # logging.debug(f"{curr_pager = }")
-            # logging.debug(f"{pagers = }")
+        # logging.debug(f"{curr_pager = }")
+        # logging.debug(f"{pagers = }")
 
-            if not pagers:
-                if curr_pager:
-                    logging.info("search_total() - there's only one page")
-                    return total_of(curr_pager)
-                else:
-                    logging.info("search_total() returning 0 - not in a page?")
-                    return 0
+        if not pagers:
+            if curr_pager:
+                logging.info("search_total() - there's only one page")
+                return total_of(curr_pager)
+            else:
+                logging.info("search_total() returning 0 - not in a page?")
+                return 0
 
-            def search_last(a, b): return a if total_of(a) > total_of(b) else b
+        def search_last(a, b): return a if total_of(a) > total_of(b) else b
 
-            if curr_pager:
-                pagers.append(curr_pager)
+        if curr_pager:
+            pagers.append(curr_pager)
 
-            return total_of(reduce(search_last, pagers))
+        return total_of(reduce(search_last, pagers))
 
-        def get_trs(soup: BeautifulSoup):
-            trs = soup.find_all("tr", id=re.compile(r"^trTorrentRow$"))
-            if trs:
-                # Correction on the first tr
-                table_teste = soup.find("table", class_=re.compile(r"^teste$"))
-                cursed_tr = table_teste.find_all("tr", recursive=False)[1]
-                missing_tds = cursed_tr.find_all("td", recursive=False)[2:]
-                trs[0].extend(missing_tds)
+    @classmethod
+    def get_trs(cls, soup: bs4.BeautifulSoup) -> list[bs4.Tag]:
+        trs = soup.find_all("tr", id=re.compile(r"^trTorrentRow$"))
+        if trs and len(trs[0].find_all("td", recursive=False)) < 9:
+            # Correction on the first tr
+            table_teste = soup.find("table", class_=re.compile(r"^teste$"))
+            cursed_tr = table_teste.find_all("tr", recursive=False)[1]
+            missing_tds = cursed_tr.find_all("td", recursive=False)[2:]
+            trs[0].extend(missing_tds)
 
-            return trs
+        return trs
 
+    @classmethod
+    async def stream_request(cls, query: str, **kwargs):
         params = {
             "search": query,
             "page": 0,
@@ -157,19 +314,18 @@ class AnimeNSK_Torrent(Queryable):
             **kwargs.get("params", {})
         }
 
-        return await _make_php_request(
+        async for batch in _stream_php_request(
             query=query,
             **kwargs,
             cls=cls,
             SITE_PAGE_LENGTH=15,
             params=params,
-            search_total=search_total,
-            get_trs=get_trs,
             needed_cookies={"pass", "uid"},
-        )
+        ):
+            yield batch
 
     @ classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    def parse_entries(cls, entries: list) -> list[Entry]:
         new_entries = []
 
         types = {"Anime TV": "Completo",
@@ -186,23 +342,25 @@ class AnimeNSK_Torrent(Queryable):
 
             _type = get_attr(tds[0].find("img"), "alt")
 
-            new_entries.append({
-                "title": get_body(tds[1].find("a")),
-                "type": types.get(_type, _type),
-                "page": cls.END_POINT + get_href(tds[1].find("a")).replace("&hit=1", ""),
-                "multiplier": get_body(tds[1].find("font", color="red")),
-                "free_leech": get_body(tds[1].find("font", color="green")),
+            new_entries.append(Entry(
+                title=get_body(tds[1].find("a")),
+                type=types.get(_type, _type),
+                page=cls.END_POINT + get_href(tds[1].find("a")).replace("&hit=1", ""),
 
-                "size": get_body(tds[5]),
-                "seeds": as_int(get_body(tds[7])),
-                "leechers": as_int(get_body(tds[8])),
-                "completions": as_int(get_body(tds[6])),
-                "archive_qtd": as_int(get_body(tds[2])),
+                size=as_bytes(get_body(tds[5])),
+                seeds=as_int(get_body(tds[7])),
+                leechers=as_int(get_body(tds[8])),
+                completions=as_int(get_body(tds[6])),
+                files=as_int(get_body(tds[2])),
 
                 # "seeders_list_link" : "",
                 # "leechers_list_link" : "",
                 # "archive_list_link" : cls.END_POINT + get_href(tds[4].find("a")),
-            })
+                extras={
+                    "multiplier": get_body(tds[1].find("font", color="red")),
+                    "free_leech": get_body(tds[1].find("font", color="green")),
+                },
+            ))
 
         return new_entries
 
@@ -218,24 +376,24 @@ class AnimeNSK_Torrent(Queryable):
         for cell in data['entries']:
 
             style = ""
-            if cell['seeds'] == 0:
+            if cell.seeds == 0:
                 style += " dim"
 
             type_style = {
                 "Completo": "complete",
                 "OVA": "special",
                 "Filme": "movie",
-            }.get(cell['type'], "white")
+            }.get(cell.type, "white")
 
             t.add_row(
                 (
-                    with_style(cell['free_leech'], "spring_green3 bold") +
-                    with_style(cell['multiplier'], "indian_red1 bold") +
-                    cell['title']
+                    with_style(cell.extras['free_leech'], "spring_green3 bold") +
+                    with_style(cell.extras['multiplier'], "indian_red1 bold") +
+                    cell.title
                 ),
-                with_style(cell['type'], type_style),
-                cell['size'],
-                as_link(cell['page']),
+                with_style(cell.type, type_style),
+                as_size(cell.size),
+                as_link(cell.page),
                 style=style
             )
 
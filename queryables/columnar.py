@@ -0,0 +1,305 @@
+"""
+Column-oriented binary files for the big cache values, catalogs and their
+indexes, as written by save_cache() with cache_format "columnar".
+
+Each column is a block of chunks of CHUNK_ROWS rows: uint32 offsets into
+the UTF-8 strings (or the integers) of those rows, compressed on their
+own. The file is memory mapped and only its small header is read when
+opened, a chunk is decompressed when one of its rows is first read and
+strings are decoded when indexed.
+
+    b"ANIC" | uint32 header size | header JSON | column blocks
+"""
+
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+from math import ceil
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from importlib.util import find_spec
+
+from queryables import lazy_import
+from queryables.index import pack, unpack
+
+MAGIC = b"ANIC"
+# Files of another version are read as missing, and written again
+VERSION = 1
+# Rows of a column decompressed at once
+CHUNK_ROWS = 1024
+# Offsets and integers of the blocks, native as the cache never leaves its machine
+WORD = "I"
+ALIGN = 8
+
+zstandard = lazy_import("zstandard") if find_spec("zstandard") else None
+lz4_frame = lazy_import("lz4.frame") if find_spec("lz4") else None
+
+# Compressor and decompressor of each codec, "none" leaves blocks mapped
+CODECS = {
+    "none": (None, None),
+    "zlib": (lambda b: zlib.compress(b, 1), zlib.decompress),
+}
+if zstandard is not None:
+    CODECS["zstd"] = (lambda b: zstandard.ZstdCompressor(level=3).compress(b),
+                      lambda b: zstandard.ZstdDecompressor().decompress(b))
+if lz4_frame is not None:
+    CODECS["lz4"] = (lambda b: lz4_frame.compress(b), lambda b: lz4_frame.decompress(b))
+
+# Fastest codec installed, zlib always is
+CODEC = next(c for c in ("zstd", "lz4", "zlib") if c in CODECS)
+
+
+class ColumnFile:
+    """ A memory-mapped file of columns, only its header is read when opened """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:4] != MAGIC:
+            raise ValueError(f"{path} isn't a columnar cache file")
+        size, = struct.unpack_from("<I", self._map, 4)
+        header = json.loads(self._map[8:8 + size])
+        if header.get("version") != VERSION:
+            raise ValueError(f"{path} is of another version of the format")
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written with another byte order")
+
+        self.rows = header["rows"]
+        self.meta = header["meta"]
+        self._blocks = header["columns"]
+        self._start = 8 + size
+        self._columns = {}
+
+    def column(self, name: str) -> Sequence:
+        if name not in self._columns:
+            block = self._blocks[name]
+            start = self._start + block["offset"]
+            self._columns[name] = Column(memoryview(self._map)[start:start + block["size"]],
+                                         block["rows"], block["type"], block["codec"])
+        return self._columns[name]
+
+
+class Column(Sequence):
+    """
+    A column block, each chunk of CHUNK_ROWS rows decompressed when one
+    of its rows is first read. Strings are decoded when indexed, integer
+    lists are read-only views of their chunk
+    """
+
+    def __init__(self, block: memoryview, rows: int, kind: str, codec: str):
+        count = ceil(rows / CHUNK_ROWS)
+        # Start and end of each chunk in the block
+        self._spans = block[:count * 2 * 4].cast(WORD)
+        self._block = block
+        self._rows = rows
+        self._ints = kind == "ints"
+        self._decompress = CODECS[codec][1]
+        self._chunks = {}
+
+    def __len__(self):
+        return self._rows
+
+    def chunk(self, c: int) -> tuple[memoryview, memoryview]:
+        """ Offsets of the rows of chunk c in its values, and the values """
+        if c not in self._chunks:
+            data = self._block[self._spans[2 * c]:self._spans[2 * c + 1]]
+            if self._decompress:
+                data = memoryview(self._decompress(data))
+
+            rows = min(CHUNK_ROWS, self._rows - c * CHUNK_ROWS)
+            values = data[(rows + 1) * 4:]
+            self._chunks[c] = (data[:(rows + 1) * 4].cast(WORD),
+                               values[:len(values) // 4 * 4].cast(WORD) if self._ints else values)
+        return self._chunks[c]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._rows))]
+        if i < 0:
+            i += self._rows
+        if not 0 <= i < self._rows:
+            raise IndexError(i)
+
+        offsets, values = self.chunk(i // CHUNK_ROWS)
+        i %= CHUNK_ROWS
+        value = values[offsets[i]:offsets[i + 1]]
+        return value if self._ints else str(value, "utf-8")
+
+
+class Rows(Sequence):
+    """ A catalog of rows of strings, read column by column """
+
+    def __init__(self, file: ColumnFile):
+        self._file = file
+        self.width = file.meta["width"]
+
+    def __len__(self):
+        return self._file.rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return [self.column(j)[i] for j in range(self.width)]
+
+    def column(self, j: int) -> Sequence:
+        return self._file.column(str(j))
+
+
+class Postings:
+    """ The grams of an index and their titles, as the dict search_index() reads """
+
+    def __init__(self, grams: Column, postings: Column):
+        self._grams = grams
+        self._postings = postings
+
+    def __len__(self):
+        return len(self._grams)
+
+    def get(self, gram: str, default=None):
+        # Grams are written sorted, a lookup decodes only a few of them
+        i = bisect_left(self._grams, gram)
+        if i < len(self._grams) and self._grams[i] == gram:
+            return self._postings[i]
+        return default
+
+    def items(self):
+        return zip(self._grams, self._postings)
+
+
+def column(rows, j: int) -> Sequence:
+    """ The j cells of a catalog, without reading its other columns """
+    return rows.column(j) if isinstance(rows, Rows) else [row[j] for row in rows]
+
+
+def encode(value) -> tuple[dict, dict]:
+    """
+    Columns of a catalog (rows of strings, all as wide) or of an index
+    from build_index(), and their meta. None for any other value
+    """
+    if isinstance(value, dict) and set(value) == {"version", "count", "titles", "grams"}:
+        grams = sorted(value["grams"])
+        # Positions are kept unpacked, chunks being compressed already
+        return {
+            "titles": ("str", value["titles"]),
+            "grams": ("str", grams),
+            "postings": ("ints", [unpack(value["grams"][g]) for g in grams]),
+        }, {"kind": "index", "version": value["version"], "count": value["count"]}
+
+    if (isinstance(value, list) and value and isinstance(value[0], (list, tuple))
+            and all(isinstance(row, (list, tuple)) and len(row) == len(value[0])
+                    and all(isinstance(cell, str) for cell in row) for row in value)):
+        return {str(j): ("str", [row[j] for row in value]) for j in range(len(value[0]))}, \
+            {"kind": "rows", "width": len(value[0])}
+
+    return None
+
+
+def decode(file: ColumnFile):
+    """ The lazy counterpart of the value encoded in file """
+    if file.meta["kind"] == "index":
+        return {
+            "version": file.meta["version"],
+            "count": file.meta.get("count"),
+            "titles": file.column("titles"),
+            "grams": Postings(file.column("grams"), file.column("postings")),
+        }
+    return Rows(file)
+
+
+def is_lazy(value) -> bool:
+    return isinstance(value, Rows) or (isinstance(value, dict) and isinstance(value.get("grams"), Postings))
+
+
+def materialize(value):
+    """ A decoded value as the plain lists and dicts JSON would give """
+    if isinstance(value, Rows):
+        return [list(row) for row in value]
+    if is_lazy(value):
+        return {"version": value["version"], "count": value["count"], "titles": list(value["titles"]),
+                "grams": {g: pack(list(p)) for g, p in value["grams"].items()}}
+    return value
+
+
+def make_chunk(kind: str, values: list) -> bytes:
+    """ uint32 offsets of each value in the values after them """
+    offsets = array(WORD, [0])
+    if kind == "ints":
+        data = array(WORD)
+        for v in values:
+            data.extend(v)
+            offsets.append(len(data))
+        return offsets.tobytes() + data.tobytes()
+
+    data = bytearray()
+    for v in values:
+        data += v.encode("utf-8")
+        offsets.append(len(data))
+    return offsets.tobytes() + bytes(data)
+
+
+def make_block(kind: str, values: list, compress) -> bytes:
+    """ The spans of the chunks of values, then the chunks, each one aligned """
+    chunks = []
+    for start in range(0, len(values), CHUNK_ROWS):
+        chunk = make_chunk(kind, values[start:start + CHUNK_ROWS])
+        chunk += b"\0" * (-len(chunk) % ALIGN)
+        chunks.append(compress(chunk) if compress else chunk)
+
+    spans = array(WORD)
+    offset = len(chunks) * 2 * 4
+    for chunk in chunks:
+        offset += -offset % ALIGN
+        spans.extend((offset, offset + len(chunk)))
+        offset += len(chunk)
+
+    block = bytearray(spans.tobytes())
+    for chunk, start in zip(chunks, spans[::2]):
+        block += b"\0" * (start - len(block)) + chunk
+    return bytes(block)
+
+
+def write(path: str, value, codec: str = None) -> bool:
+    """ Writes value to path when it can be encoded, replacing the old file at once """
+    encoded = encode(value)
+    if encoded is None:
+        return False
+
+    columns, meta = encoded
+    codec = codec or CODEC
+    compress = CODECS[codec][0]
+
+    blocks = {name: (kind, len(values), make_block(kind, values, compress))
+              for name, (kind, values) in columns.items()}
+
+    rows = len(next(iter(columns.values()))[1])
+    header = {"version": VERSION, "byteorder": sys.byteorder, "rows": rows, "meta": meta, "columns": {}}
+
+    # Offsets are from the end of the header, padded for the blocks to stay aligned
+    offset = 0
+    for name, (kind, length, block) in blocks.items():
+        offset += -offset % ALIGN
+        header["columns"][name] = {"type": kind, "rows": length, "codec": codec,
+                                   "offset": offset, "size": len(block)}
+        offset += len(block)
+
+    head = json.dumps(header).encode()
+    head += b" " * (-(8 + len(head)) % ALIGN)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(head)) + head)
+        start = f.tell()
+        for name, (_, _, block) in blocks.items():
+            f.write(b"\0" * (start + header["columns"][name]["offset"] - f.tell()))
+            f.write(block)
+    os.replace(path + ".tmp", path)
+    return True
+
+
+def read(path: str):
+    return decode(ColumnFile(path))
@@ -0,0 +1,63 @@
+import re
+from dataclasses import dataclass, field, fields
+
+SIZE_UNITS = {"B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def as_number(s: str) -> float:
+    """
+    '1.023,45' and '1,023.45' alike: the last separator is the decimal
+    one, unless the only separator is repeated as in '1.048.576'
+    """
+    separators = [c for c in s if c in ".,"]
+    if not separators:
+        return float(s)
+    decimal = separators[-1]
+    if len(separators) > 1 and set(separators) == {decimal}:
+        return float(s.replace(decimal, ""))
+    grouping = "," if decimal == "." else "."
+    return float(s.replace(grouping, "").replace(decimal, "."))
+
+
+def as_bytes(s: str) -> int:
+    """ Sizes like '25.35 GB', '198M' or '1,5 GiB' in bytes, 0 (unknown) without a unit """
+    match = re.search(r"(\d[\d.,]*)\s*(?:([KMGT])I?B?|(B))(?![A-Z])", s.upper())
+    if not match:
+        return 0
+    return int(as_number(match.group(1).rstrip(".,")) * SIZE_UNITS[match.group(2) or match.group(3)])
+
+
+def as_size(n: int) -> str:
+    if not n:
+        return ""
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            break
+        n /= 1024
+    else:
+        unit = "TB"
+    return f"{n:.2f} {unit}" if unit != "B" else f"{n} B"
+
+
+@dataclass(slots=True)
+class Entry:
+    """
+    An entry of any queryable. Counts are ints and size is in bytes,
+    what only some sites have goes in extras
+    """
+    title: str
+    page: str = ""
+    type: str = ""
+    size: int = 0
+    seeds: int = 0
+    leechers: int = 0
+    completions: int = 0
+    files: int = 0
+    uploader: str = ""
+    extras: dict = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {f: getattr(self, f) for f in ENTRY_FIELDS}
+
+
+ENTRY_FIELDS = tuple(f.name for f in fields(Entry))
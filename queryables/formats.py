@@ -0,0 +1,60 @@
+import csv
+import json
+import sys
+from enum import Enum
+from importlib.util import find_spec
+
+from queryables import lazy_import
+from queryables.entry import Entry, ENTRY_FIELDS
+
+msgpack = lazy_import("msgpack") if find_spec("msgpack") else None
+
+# Outputs which already have a csv header
+_csv_headers = set()
+
+
+def write_jsonl(queryable: str, entries: list[Entry], out):
+    for entry in entries:
+        out.write(json.dumps({"queryable": queryable, **entry.as_dict()},
+                             ensure_ascii=False) + "\n")
+
+
+def write_csv(queryable: str, entries: list[Entry], out):
+    """ The same columns for every site, with extras as a JSON object """
+    w = csv.writer(out)
+    if id(out) not in _csv_headers:
+        _csv_headers.add(id(out))
+        w.writerow(("queryable", *ENTRY_FIELDS))
+    for entry in entries:
+        row = entry.as_dict()
+        row["extras"] = json.dumps(row["extras"], ensure_ascii=False)
+        w.writerow((queryable, *row.values()))
+
+
+def write_msgpack(queryable: str, entries: list[Entry], out):
+    packer = msgpack.Packer()
+    for entry in entries:
+        out.write(packer.pack({"queryable": queryable, **entry.as_dict()}))
+
+
+# Formats written straight from the parsed entries, without any table
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv, "msgpack": write_msgpack}
+BINARY_FORMATS = {"msgpack"}
+
+
+def missing_dependency(fmt: str) -> str:
+    """ Why fmt can't be written, if it can't """
+    if fmt == "msgpack" and msgpack is None:
+        return "msgpack format requires msgpack (pip install msgpack)"
+    return ""
+
+
+def write_entries(fmt: str, queryable: str, entries: list[Entry], out=None):
+    """ Writes and flushes entries to out, stdout by default """
+    if out is None:
+        out = sys.stdout.buffer if fmt in BINARY_FORMATS else sys.stdout
+    WRITERS[fmt](queryable, entries, out)
+    out.flush()
+
+
+formats_enum = Enum('Formats', {f: f for f in ("table", *WRITERS)})
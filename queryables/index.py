@@ -0,0 +1,133 @@
+import re
+import sys
+import base64
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import accumulate
+from math import ceil
+
+GRAM = 3
+# Share of the query trigrams a title needs to be a fuzzy match
+FUZZY = 0.7
+# Indexes built by older versions are built again
+INDEX_VERSION = 4
+
+
+def fold(s: str) -> str:
+    """ Lowercase without accents, so "Ação" and "acao" are the same """
+    s = s.lower()
+    if s.isascii():
+        return s
+    return "".join(c for c in unicodedata.normalize("NFKD", s)
+                   if not unicodedata.combining(c))
+
+
+def normalize(s: str) -> str:
+    """ Folded words separated by single spaces, without punctuation """
+    return " ".join(re.findall(r"\w+", fold(s)))
+
+
+def grams(s: str) -> set[str]:
+    return {s[i:i+GRAM] for i in range(len(s) - GRAM + 1)}
+
+
+def pack(positions: list[int]) -> str:
+    """
+    Ascending positions as the base64 of their differences, in the
+    smallest little-endian array they fit in, its typecode first
+    """
+    deltas = [b - a for a, b in zip([0, *positions], positions)]
+    code = next(c for c in "BHI" if max(deltas) < 1 << 8 * array(c).itemsize)
+    packed = array(code, deltas)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return code + base64.b64encode(packed.tobytes()).decode()
+
+
+def unpack(packed: str) -> list[int]:
+    deltas = array(packed[0], base64.b64decode(packed[1:]))
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return list(accumulate(deltas))
+
+
+def postings(index: dict, gram: str):
+    """ Positions of the titles with gram, packed or not """
+    found = index["grams"].get(gram)
+    if found is None:
+        return ()
+    return unpack(found) if isinstance(found, str) else found
+
+
+def title_grams(normalized: list[str], start: int = 0) -> dict[str, list[int]]:
+    found = {}
+    for i, title in enumerate(normalized, start):
+        for g in grams(title):
+            found.setdefault(g, []).append(i)
+    return found
+
+
+def build_index(titles: list[str]) -> dict:
+    """
+    Trigram index of a catalog, built once when it's cached so queries
+    never normalize the catalog: its normalized titles and the packed
+    positions of the titles with each trigram
+    """
+    normalized = [normalize(t) for t in titles]
+    return {"version": INDEX_VERSION, "count": len(titles), "titles": normalized,
+            "grams": {g: pack(found) for g, found in title_grams(normalized).items()}}
+
+
+def extend_index(index: dict, titles: list[str]) -> dict:
+    """ index with titles appended after its own, as if built with all of them """
+    normalized = [normalize(t) for t in titles]
+    packed = dict(index["grams"])
+
+    for g, found in title_grams(normalized, index["count"]).items():
+        packed[g] = pack([*postings(index, g), *found])
+
+    return {"version": INDEX_VERSION, "count": index["count"] + len(titles),
+            "titles": [*index["titles"], *normalized], "grams": packed}
+
+
+def search_index(index: dict, query: str, fuzzy: float = FUZZY) -> list[int]:
+    """
+    Positions of the titles matching query, best first. Titles containing
+    query come first, by where it starts, then titles with at least fuzzy
+    of the query trigrams, by how many they have
+    """
+    titles = index["titles"]
+    query = normalize(query)
+    found = {g: postings(index, g) for g in grams(query)}
+
+    if len(query) < GRAM:
+        candidates = range(len(titles))
+    else:
+        # Every match contains all query grams: the rarest one is enough
+        # to narrow the candidates, which find() then confirms
+        candidates = min(found.values(), key=len)
+
+    matches = []
+    for i in candidates:
+        pos = titles[i].find(query)
+        if pos >= 0:
+            matches.append((pos, i))
+
+    matches.sort()
+    matches = [i for _, i in matches]
+
+    if not fuzzy or len(query) < GRAM:
+        return matches
+
+    # Trigrams each title shares with query, counted from the postings
+    shared = Counter()
+    for positions in found.values():
+        shared.update(positions)
+
+    exact = set(matches)
+    needed = ceil(len(found) * fuzzy)
+    similar = [(-n, i) for i, n in shared.items() if n >= needed and i not in exact]
+    similar.sort()
+
+    return matches + [i for _, i in similar]
@@ -8,40 +8,35 @@ class Info_Anime(Queryable):
     @classmethod
     async def make_request(cls, query: str, session: aiohttp.ClientSession, all_pages=False, page=0, length=30, **kwargs) -> dict:
         start = page * length
-        links = cls.read_cache("all") or {}
 
-        if not links:
-            url = cls.END_POINT + "/listageral"
-            params = kwargs.get("params", {})
+        url = cls.END_POINT + "/listageral"
+        params = kwargs.get("params", {})
 
-            async with session.get(url=url, params=params) as res:
-                cls.log_response(res)
-
-                content = (res.ok and await res.text()) or ""
-                soup = BeautifulSoup(content, 'html.parser')
-
-                ul = soup.find(id="myUL")
-                all_links = ul.find_all("a", href=re.compile(r"^dados\?obra="))
-
-                links = {get_body(a): cls.END_POINT + get_href(a)
-                         for a in all_links}
-
-                cls.write_cache("all", links)
+        links = await cls.cached_catalog(
+            "all", session, url, params=params,
+            rate_limit=kwargs.get("rate_limit"),
+            timeout=kwargs.get("timeout"),
+            cache_hour_limit=kwargs.get("cache_hour_limit"),
+            stale_while_revalidate=kwargs.get("stale_while_revalidate"))
+        # Older caches kept a {title: link} dict instead of pairs
+        if isinstance(links, dict):
+            links = list(links.items())
 
         entries = kwargs.get("entries", [])
 
         if query:
-            filtered = [l for l in links.items() if query in l[0].lower()]
-        else:
-            filtered = list(links.items())
-
-        entries.extend(filtered[start:]
-                       if all_pages else filtered[start:start+length])
+            # Only the titles are read, and the rows of the matches shown
+            index = cls.catalog_index(columnar.column(links, 0))
+            matches = search_index(index, query, kwargs.get("fuzzy", FUZZY))
+            total = len(matches)
 
-        if query:
-            entries.sort(key=lambda e: e[0].lower().find(query))
+            matches = matches[start:] if all_pages else matches[start:start+length]
+            entries.extend(links[i] for i in matches)
+        else:
+            total = len(links)
+            entries.extend(links[start:]
+                           if all_pages else links[start:start+length])
 
-        total = len(filtered)
         showing = len(entries)
         remaining = max(0, total - (start + showing))
 
@@ -54,13 +49,23 @@ class Info_Anime(Queryable):
         }
 
     @classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    def parse_page(cls, content) -> dict:
+        all_links = [a for a in extract(content, "a", within=("ul", {"id": "myUL"}))
+                     if get_href(a).startswith("dados?obra=")]
+
+        # A title listed twice keeps its last link
+        links = dict((get_body(a), cls.END_POINT + get_href(a)) for a in all_links)
+        links = [list(link) for link in links.items()]
+        return {"entries": links, "total": len(links)}
+
+    @classmethod
+    def parse_entries(cls, entries: list) -> list[Entry]:
         new_entries = []
         for cell in entries:
-            new_entries.append({
-                "title": cell[0],
-                "page": cell[1],
-            })
+            new_entries.append(Entry(
+                title=cell[0],
+                page=cell[1],
+            ))
         return new_entries
 
     @classmethod
@@ -72,8 +77,8 @@ class Info_Anime(Queryable):
 
         for cell in data['entries']:
             t.add_row(
-                cell['title'],
-                as_link(cell['page']),
+                cell.title,
+                as_link(cell.page),
             )
 
         return t
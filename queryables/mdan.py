@@ -1,45 +1,55 @@
+from __future__ import annotations
 from queryables.queryable import *
-from queryables.queryable import _make_php_request
+from queryables.queryable import _stream_php_request
 
 
 class MDAN(Queryable):
 
     END_POINT = "https://bt.mdan.org/"
+    RESPONSE_CACHE = True
+    SYNC = True
+    # Torrent rows and the pagers table
+    STRAINER = {"class_": ["browse_color", "main"]}
 
     @classmethod
-    async def make_request(cls, query: str, **kwargs) -> dict:
+    async def make_request(cls, **kwargs) -> dict:
+        return await collect_stream(cls.stream_request(**kwargs))
 
-        def search_total(soup: BeautifulSoup, trs: list[Tag]) -> int:
-            curr_page_qtd = len(trs)
-            table = soup.find("table", "main", align="center")
-            curr_pager = table and table.find("td", class_="highlight")
-
-            if not table or not curr_pager:
-                return curr_page_qtd  # not in a page, curr_page_qtd probably 0
-
-            exp = re.compile(r"^browse\.php\?.*page=(\d+).*")
-            pagers = table.find_all(
-                href=exp,
-                title=lambda t: t and len(t.split("-")) == 2
-            )
+    @classmethod
+    def search_total(cls, soup: bs4.BeautifulSoup, trs: list[bs4.Tag]) -> int:
+        curr_page_qtd = len(trs)
+        table = soup.find("table", "main", align="center")
+        curr_pager = table and table.find("td", class_="highlight")
+
+        if not table or not curr_pager:
+            return curr_page_qtd  # not in a page, curr_page_qtd probably 0
+
+        exp = re.compile(r"^browse\.php\?.*page=(\d+).*")
+        pagers = table.find_all(
+            href=exp,
+            title=lambda t: t and len(t.split("-")) == 2
+        )
 
-            if not pagers:
-                return curr_page_qtd  # there's only one page
+        if not pagers:
+            return curr_page_qtd  # there's only one page
 
-            def pager_i(tag): return int(exp.search(tag.get("href")).group(1))
-            def search_last(a, b): return a if pager_i(a) > pager_i(b) else b
+        def pager_i(tag): return int(exp.search(tag.get("href")).group(1))
+        def search_last(a, b): return a if pager_i(a) > pager_i(b) else b
 
-            last_pager = reduce(search_last, pagers)
-            last_pager_total = int(last_pager.get("title").split("-")[1])
-            last_pager_i = pager_i(last_pager)
+        last_pager = reduce(search_last, pagers)
+        last_pager_total = int(last_pager.get("title").split("-")[1])
+        last_pager_i = pager_i(last_pager)
 
-            current_pager_i = as_int(curr_pager.string) - 1
+        current_pager_i = as_int(curr_pager.string) - 1
 
-            return last_pager_total + (curr_page_qtd if last_pager_i <= current_pager_i else 0)
+        return last_pager_total + (curr_page_qtd if last_pager_i <= current_pager_i else 0)
 
-        def get_trs(soup: BeautifulSoup):
-            return soup.find_all("tr", class_=re.compile(r"^browse_color$"))
+    @classmethod
+    def get_trs(cls, soup: bs4.BeautifulSoup) -> list[bs4.Tag]:
+        return soup.find_all("tr", class_=re.compile(r"^browse_color$"))
 
+    @classmethod
+    async def stream_request(cls, query: str, **kwargs):
         params = {
             "cats1[]": [1, 2, 5],  # Animes
             "cats2[]": 3,  # Movies
@@ -52,19 +62,18 @@ class MDAN(Queryable):
             **kwargs.get("params", {})
         }
 
-        return await _make_php_request(
+        async for batch in _stream_php_request(
             query=query,
             **kwargs,
             cls=cls,
             SITE_PAGE_LENGTH=30,
             params=params,
-            search_total=search_total,
-            get_trs=get_trs,
             needed_cookies={"pass", "hashv", "uid"},
-        )
+        ):
+            yield batch
 
     @classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    def parse_entries(cls, entries: list) -> list[Entry]:
         '''
         <tr class="browse_color">
             <td><a href="browse.php?cat=5"><img alt="Completo" src="./pic/caticons/1/completo.gif"/></a></td>
@@ -103,28 +112,29 @@ class MDAN(Queryable):
                 cls.log(logging.warn, f"Found a probably invalid entry")
                 logging.debug(cell)
 
-            new_entries.append({
-                "title": get_body(tds[1].find("b")),
-                "page": cls.END_POINT + get_href(tds[1].find("a")).replace("&hit=1", ""),
-                "type": get_attr(tds[0].find("img"), "alt"),
-
-                "date": separate(list(tds[6].find("span").children)),
-                "silver": False,  # There's no example to use
-                "salva_ratio": bool(tds[1].find("a", id="torrenth")),
+            new_entries.append(Entry(
+                title=get_body(tds[1].find("b")),
+                page=cls.END_POINT + get_href(tds[1].find("a")).replace("&hit=1", ""),
+                type=get_attr(tds[0].find("img"), "alt"),
 
-                "seeds": as_int(get_body(bs[0].find("font"))) if 0 < len(bs) else 0,
-                "leechers": as_int(get_body(bs[1].find("a"))) if 1 < len(bs) else 0,
-                "completions": as_int(get_body(tds[3])),
-                "size": separate(list(tds[5].children)),
-                "archive_qtd": as_int(get_body(tds[4].find("a"))),
+                seeds=as_int(get_body(bs[0].find("font"))) if 0 < len(bs) else 0,
+                leechers=as_int(get_body(bs[1].find("a"))) if 1 < len(bs) else 0,
+                completions=as_int(get_body(tds[3])),
+                size=as_bytes(separate(list(tds[5].children))),
+                files=as_int(get_body(tds[4].find("a"))),
 
                 # "seeders_list_link" : "",
                 # "leechers_list_link" : "",
                 # "archive_list_link" : cls.END_POINT + get_href(tds[4].find("a")),
 
-                "uploader_name": get_body(tds[7].find("b")),
-                "uploader_link": cls.END_POINT + get_href(tds[7].find("a")),
-            })
+                uploader=get_body(tds[7].find("b")),
+                extras={
+                    "date": separate(list(tds[6].find("span").children)),
+                    "silver": False,  # There's no example to use
+                    "salva_ratio": bool(tds[1].find("a", id="torrenth")),
+                    "uploader_link": cls.END_POINT + get_href(tds[7].find("a")),
+                },
+            ))
         return new_entries
 
     @classmethod
@@ -139,7 +149,7 @@ class MDAN(Queryable):
         for cell in data['entries']:
 
             style = ""
-            if cell['seeds'] == 0:
+            if cell.seeds == 0:
                 style += " dim"
 
             type_style = {
@@ -147,13 +157,13 @@ class MDAN(Queryable):
                 "Completo": "complete",
                 "OVAs": "special",
                 "Filmes": "movie",
-            }.get(cell['type'], "white")
+            }.get(cell.type, "white")
 
             t.add_row(
-                cell['title'],
-                with_style(cell['type'], type_style),
-                cell['size'],
-                as_link(cell['page']),
+                cell.title,
+                with_style(cell.type, type_style),
+                as_size(cell.size),
+                as_link(cell.page),
                 style=style
             )
 
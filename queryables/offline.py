@@ -0,0 +1,168 @@
+import json
+import logging
+import datetime
+import sqlite3
+from os.path import dirname, realpath
+
+import aiohttp
+
+from queryables.entry import Entry
+from queryables.index import fold, normalize
+from queryables.queryable import Queryable
+
+OFFLINE_DB = dirname(dirname(realpath(__file__))) + "/offline.sqlite3"
+
+# Every entry synced, by its page, and their titles in a full-text index
+# kept by the triggers. Accents are ignored like in catalog searches.
+# Entries are inserted in the order of their listing, newest first
+OFFLINE_TABLES = """
+CREATE TABLE IF NOT EXISTS entries (
+    queryable TEXT NOT NULL,
+    page TEXT NOT NULL,
+    title TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    added TEXT NOT NULL,
+    synced TEXT NOT NULL,
+    PRIMARY KEY (queryable, page)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(
+    title, content='entries', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO titles (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO titles (titles, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF title ON entries BEGIN
+    INSERT INTO titles (titles, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO titles (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TABLE IF NOT EXISTS syncs (
+    queryable TEXT PRIMARY KEY,
+    time TEXT NOT NULL,
+    complete INTEGER NOT NULL
+);
+"""
+
+_db = None
+
+
+def open_db() -> sqlite3.Connection:
+    global _db
+
+    if _db is None:
+        _db = sqlite3.connect(OFFLINE_DB, timeout=30)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.executescript(OFFLINE_TABLES)
+    return _db
+
+
+def last_sync(queryable: str) -> tuple[str, bool]:
+    """ Time of the last sync of queryable and if it crawled every page, or (None, False) """
+    row = open_db().execute(
+        "SELECT time, complete FROM syncs WHERE queryable = ?", (queryable,)).fetchone()
+    return (row[0], bool(row[1])) if row else (None, False)
+
+
+def save_entries(queryable: str, entries: list[Entry], time: str) -> int:
+    """ Adds or updates entries synced at time, returning how many were already synced """
+    db = open_db()
+    pages = [e.page for e in entries]
+
+    with db:
+        known = db.execute(
+            f"SELECT count(*) FROM entries WHERE queryable = ? AND page IN ({', '.join('?' * len(pages))})",
+            (queryable, *pages)).fetchone()[0]
+        db.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (queryable, page) DO UPDATE SET "
+            "title = excluded.title, entry = excluded.entry, synced = excluded.synced",
+            [(queryable, e.page, e.title, json.dumps(e.as_dict(), ensure_ascii=False), time, time)
+             for e in entries])
+
+    return known
+
+
+async def sync_queryable(cls: Queryable, session: aiohttp.ClientSession, full: bool = False, **kwargs) -> dict:
+    """
+    Crawls the listing of cls, newest first, into the offline database.
+    After a complete crawl, the next ones stop at the first page with an
+    entry already synced, unless full
+    """
+    _, complete = last_sync(cls.__name__)
+    incremental = complete and not full
+    time = datetime.datetime.today().isoformat()
+
+    # Every page from the first, crawled fresh instead of from the response cache
+    stream = cls.stream_request(**{**kwargs, "query": "", "session": session, "all_pages": True,
+                                   "page": 0, "response_cache_seconds": 0})
+    synced = new = 0
+    finished = False
+
+    try:
+        async for batch in stream:
+            entries = cls.parse_data(batch)["entries"]
+            if not entries:
+                continue
+
+            known = save_entries(cls.__name__, entries, time)
+            synced += len(entries)
+            new += len(entries) - known
+
+            if incremental and known:
+                cls.log(logging.info, "Reached the entries of the last sync")
+                break
+        finished = True
+    finally:
+        await stream.aclose()
+
+        # An interrupted crawl leaves a gap, which only a full one fills
+        if synced or finished:
+            with open_db() as db:
+                db.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)",
+                           (cls.__name__, time, int(finished and (complete or not incremental))))
+
+    return {"synced": synced, "new": new, "incremental": incremental}
+
+
+def match_query(query: str) -> str:
+    """ Every word of query, as a prefix, in the FTS5 query syntax """
+    return " ".join(f'"{word}"*' for word in normalize(fold(query)).split())
+
+
+async def search_stream(cls: Queryable, query: str, all_pages: bool = False, page: int = 0, length: int = 30, **_):
+    """ A batch of the synced entries of cls, like stream_request() yields """
+    time, _ = last_sync(cls.__name__)
+    if time is None:
+        raise ConnectionError(f"{cls.NAME()} - Never synced, run `sync` first")
+
+    db = open_db()
+    start = page * length
+    limit = -1 if all_pages else length
+
+    if match_query(query):
+        where = "FROM titles JOIN entries ON entries.rowid = titles.rowid " \
+                "WHERE titles MATCH ? AND queryable = ?"
+        params = (match_query(query), cls.__name__)
+        order = "ORDER BY titles.rank"
+    else:
+        where = "FROM entries WHERE queryable = ?"
+        params = (cls.__name__,)
+        # Entries of the latest syncs first, each in its listing order
+        order = "ORDER BY added DESC, entries.rowid"
+
+    total = db.execute(f"SELECT count(*) {where}", params).fetchone()[0]
+    rows = db.execute(f"SELECT entry {where} {order} LIMIT ? OFFSET ?",
+                      (*params, limit, start)).fetchall()
+
+    entries = [Entry(**json.loads(entry)) for entry, in rows]
+    yield {
+        "entries": entries,
+        "start": start,
+        "showing": len(entries),
+        "remaining": max(0, total - (start + len(entries))),
+        "total": total,
+        "parsed": True,
+        "offline": time,
+    }
@@ -1,26 +1,104 @@
+from __future__ import annotations
+
 import logging
 import re
 import json
 import datetime
-from os.path import dirname, realpath
-from bs4 import BeautifulSoup, Tag
+import sqlite3
+import hashlib
+import zlib
+from http import HTTPStatus
+import os
+from os.path import basename, dirname, realpath
 from rich.table import Table
 from rich.markup import escape
-from time import sleep
+from time import monotonic, perf_counter
 from functools import reduce
 from math import ceil
+from urllib.parse import urlsplit
+from html.parser import HTMLParser
+from importlib.util import find_spec
 import asyncio
 import aiohttp
 
+from queryables import lazy_import, timings, columnar
+from queryables.index import build_index, extend_index, search_index, FUZZY, INDEX_VERSION
+from queryables.entry import Entry, ENTRY_FIELDS, as_bytes, as_size
+
+# Only the sites scraping html need a soup, imported on their first one
+bs4 = lazy_import("bs4")
+
 CACHE_FILE = dirname(dirname(realpath(__file__))) + "/cache.json"
+CACHE_DB = dirname(dirname(realpath(__file__))) + "/cache.sqlite3"
 MAX_SYNC_REQUESTS = 5
-MIN_TESTS = 2
+MAX_RETRIES = 2
 RECURSIVE_DELAY = 0.5
 
+# Default politeness for every host: a burst of MAX_SYNC_REQUESTS, then one
+# request each RECURSIVE_DELAY seconds. Overridable per queryable in config.json
+RATE_LIMIT = {"rate": 1 / RECURSIVE_DELAY, "burst": MAX_SYNC_REQUESTS}
+# aiohttp.TCPConnector and aiohttp.ClientTimeout arguments
+CONNECTOR = {"limit": 100, "limit_per_host": MAX_SYNC_REQUESTS,
+             "ttl_dns_cache": 300, "keepalive_timeout": 30}
+TIMEOUT = {"total": None, "connect": 10, "sock_read": 30}
+
+CACHE_TABLE = """CREATE TABLE IF NOT EXISTS cache (
+    queryable TEXT NOT NULL,
+    key TEXT NOT NULL,
+    time TEXT NOT NULL,
+    value TEXT NOT NULL,
+    validators TEXT,
+    PRIMARY KEY (queryable, key)
+)"""
+# Compressed bodies of paginated searches, by response_key()
+RESPONSES_TABLE = """CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    queryable TEXT NOT NULL,
+    time TEXT NOT NULL,
+    used TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    encoding TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL
+)"""
+# Least recently used bodies past the size limit
+EVICT_RESPONSES = """DELETE FROM responses WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY used DESC) AS total FROM responses
+    ) WHERE total > ?
+)"""
+CACHE_VERSION = 2
+
 cache_hour_limit = 6
+stale_while_revalidate = False
+# "columnar" keeps catalogs and indexes in memory-mapped files of
+# cache.columns/, read lazily, instead of JSON in the database
+cache_format = "json"
+# Seconds a response of a Queryable with RESPONSE_CACHE is reused, and the
+# megabytes all the compressed bodies can take
+response_cache_seconds = 300
+response_cache_mb = 64
 strip_http = True
 
+# Fastest tree builder installed for BeautifulSoup, html.parser always is
+if find_spec("lxml"):
+    lxml_html = lazy_import("lxml.html")
+    html_parser = "lxml"
+else:
+    lxml_html = None
+    html_parser = "html.parser"
+
 _cache = None
+_rate_limiters = {}
+_in_flight = {}
+request_stats = {"coalesced": 0, "cached": 0}
+background_tasks = set()
+# Decoded cache values, kept by long-lived processes (serve)
+memory_cache = False
+_memo = {}
+cache_stats = {"hit": 0, "stale": 0, "revalidated": 0, "merged": 0, "miss": 0}
+_executor = None
 
 
 def with_style(s, style): return f'[{style}]{escape(s)}[/]'
@@ -33,10 +111,80 @@ def as_link(link, _strip_http: bool = None):
         re.sub(r"^(https?://)?(www\.)?", '', link) if _strip_http else link))
 
 
-def get_tag(text, tag): return BeautifulSoup(text, 'html.parser').find(tag)
+def make_soup(content, parse_only: bs4.SoupStrainer = None) -> bs4.BeautifulSoup:
+    return bs4.BeautifulSoup(content, html_parser, parse_only=parse_only)
+
+
+def attrs_match(attrs, wanted: dict) -> bool:
+    """ Exact values, except class which only needs to be one of them """
+    for attr, value in wanted.items():
+        if attr == "class":
+            classes = attrs.get("class") or ""
+            # bs4 already splits classes, lxml doesn't
+            if isinstance(classes, str):
+                classes = classes.split()
+            if value not in classes:
+                return False
+        elif attrs.get(attr) != value:
+            return False
+    return True
+
+
+def extract(content, tag: str, attrs: dict = None, cell: str = None, within: tuple = None) -> list:
+    """
+    Every <tag> matching attrs as a FragmentTag, with its whole text as
+    .string and, when cell is given, its <cell> children as .cells.
+    within=(tag, attrs) only looks inside the first matching container.
+
+    Uses lxml own tree when installed, which is an order of magnitude
+    cheaper than any BeautifulSoup tree, and a strained soup otherwise
+    """
+    attrs = attrs or {}
+
+    def fragment(el_attrs, text, cells=()):
+        f = FragmentTag(el_attrs)
+        f.string = text
+        f.cells = [fragment(*c) for c in cells]
+        return f
+
+    if lxml_html is not None and html_parser == "lxml":
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        root = lxml_html.fromstring(
+            content, parser=lxml_html.HTMLParser(encoding="utf-8"))
+
+        if within:
+            root = next((e for e in root.iter(within[0])
+                         if attrs_match(e.attrib, within[1])), None)
+            if root is None:
+                return []
+
+        def text(el): return lxml_html.tostring(
+            el, method="text", encoding=str, with_tail=False)
+
+        return [
+            fragment(dict(el.attrib), text(el),
+                     [(dict(c.attrib), text(c)) for c in el.iter(cell)] if cell else ())
+            for el in root.iter(tag) if attrs_match(el.attrib, attrs)
+        ]
+
+    if within:
+        soup = make_soup(content, bs4.SoupStrainer(within[0], attrs=within[1]))
+    else:
+        soup = make_soup(content, bs4.SoupStrainer(tag, attrs=attrs))
+
+    return [
+        fragment(el.attrs, el.get_text(),
+                 [(c.attrs, c.get_text()) for c in el.find_all(cell)] if cell else ())
+        for el in soup.find_all(tag) if attrs_match(el.attrs, attrs)
+    ]
+
+
+def get_tag(text, tag): return bs4.BeautifulSoup(text, 'html.parser').find(tag)
+def get_tags(text): return _fragment_parser.first_tags(text)
 def get_attr(tag, attr): return str((tag and tag.get(attr)) or "").strip()
 def get_href(tag): return get_attr(tag, "href")
-def get_body(tag): return str((tag and tag.string) or "").strip()
+def get_body(tag): return str((tag is not None and tag.string) or "").strip()
 
 
 def as_int(s): return int(re.sub(r"\D*", '', s) or 0)
@@ -46,56 +194,421 @@ def ceildiv(a, b):
     return -(a // -b)
 
 
-def save_cache():
-    global _cache
+def _init_worker(parser: str, _strip_http: bool):
+    global html_parser, strip_http
+    html_parser, strip_http = parser, _strip_http
 
-    if _cache is None or not _cache:
-        logging.info("Tried to save empty Cache")
-        return
+
+def start_workers(workers: int):
+    """ Parsing runs in this many processes, or in the event loop with 0 """
+    global _executor
+    if workers > 0 and _executor is None:
+        # Imports multiprocessing, only when it's used
+        from concurrent.futures import ProcessPoolExecutor
+
+        logging.info(f"Starting {workers} parser processes")
+        _executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(html_parser, strip_http))
+
+
+def stop_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def run_parser(func, *args):
+    queryable = getattr(getattr(func, "__self__", None), "__name__", "")
+
+    if _executor is None:
+        with timings.span(queryable, func.__name__):
+            return func(*args)
+
+    # Pages parsed at once in the pool overlap
+    with timings.span(queryable, func.__name__, id=id(args)):
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def make_session(connector: dict = None, timeout: dict = None) -> aiohttp.ClientSession:
+    """ A session whose connections are shared by every queryable """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(**{**CONNECTOR, **(connector or {})}),
+        timeout=aiohttp.ClientTimeout(**{**TIMEOUT, **(timeout or {})}),
+        trace_configs=[timings.trace_config()] if timings.enabled else None,
+    )
+
+
+async def coalesce(key, make_coro):
+    """
+    Runs make_coro() once for every caller with the same key while it's
+    running. It's only cancelled when all of them are
+    """
+    entry = _in_flight.get(key)
+
+    def forget(*_):
+        if _in_flight.get(key) is entry:
+            del _in_flight[key]
+
+    if entry is None:
+        entry = _in_flight[key] = [asyncio.create_task(make_coro()), 0]
+        entry[0].add_done_callback(forget)
+    else:
+        request_stats["coalesced"] += 1
+        logging.debug(f"Waiting for the same {key[0]} in flight")
+
+    entry[1] += 1
+    try:
+        return await asyncio.shield(entry[0])
+    finally:
+        entry[1] -= 1
+        if not entry[1] and not entry[0].done():
+            forget()
+            entry[0].cancel()
+
+
+def run_in_background(coro, name: str = None) -> asyncio.Task:
+    """ Tasks that don't block results, awaited by wait_background() """
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def wait_background():
+    for task, result in zip(list(background_tasks), await asyncio.gather(
+            *background_tasks, return_exceptions=True)):
+        if isinstance(result, Exception):
+            logging.error(f"Background task {task.get_name()} failed: {result}")
+
+
+class RateLimiter:
+    """ Async token bucket: waiting for a token only suspends the caller """
+
+    def __init__(self, rate: float, burst: int = 1):
+        assert rate > 0, f"rate_limit rate should be positive, not {rate}"
+        self.rate = rate
+        self.burst = max(1, int(burst))
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"RateLimiter<{self.rate}/s, burst {self.burst}>"
+
+    def refill(self):
+        now = monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+
+def get_rate_limiter(url: str, rate_limit: dict = None) -> RateLimiter:
+    """ Limiters are shared by host, the first configuration seen wins """
+    host = urlsplit(url).netloc
+    if host not in _rate_limiters:
+        options = {**RATE_LIMIT, **(rate_limit or {})}
+        _rate_limiters[host] = RateLimiter(options["rate"], options["burst"])
+        logging.info(f"Using {_rate_limiters[host]} for {host}")
+    return _rate_limiters[host]
+
+
+class Response:
+    """ A response already read, so it can outlive its connection """
+
+    @classmethod
+    def restore(cls, url: str, status: int, body: bytes, encoding: str) -> Response:
+        """ A response saved by save_response() """
+        self = cls.__new__(cls)
+        self.url = url
+        self.status = status
+        self.reason = HTTPStatus(status).phrase
+        self.ok = status < 400
+        self.headers = {}
+        self.body = body
+        self.encoding = encoding
+        self.elapsed = None
+        return self
+
+    def __init__(self, res: aiohttp.ClientResponse, body: bytes, elapsed: float = None):
+        self.url = res.url
+        self.status = res.status
+        self.reason = res.reason
+        self.ok = res.ok
+        self.headers = res.headers
+        self.body = body
+        # Seconds from sending the request to reading the body, None when cached
+        self.elapsed = elapsed
+        try:
+            self.encoding = res.get_encoding()
+        except RuntimeError:
+            self.encoding = "utf-8"
+
+    def text(self) -> str:
+        return self.body.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.text() or "null")
+
+
+class FragmentTag(dict):
+    """ Attributes of a tag, with its text as .string like a bs4 Tag """
+    string = None
+    cells = ()
+
+
+class FragmentParser(HTMLParser):
+    """
+    Finds the first tag of each name in a small html fragment, without
+    building a tree. Much cheaper than a BeautifulSoup per fragment
+    """
+
+    VOID_TAGS = {"img", "br", "hr", "input", "meta", "link"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+    def first_tags(self, text: str) -> dict[str, FragmentTag]:
+        self.reset()
+        self.tags = {}
+        self.open_tags = []
+        self.feed(text)
+        self.close()
+        return self.tags
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.tags:
+            return
+        self.tags[tag] = FragmentTag(attrs)
+        if tag not in self.VOID_TAGS:
+            self.tags[tag].string = ""
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.open_tags:
+            del self.open_tags[self.open_tags.index(tag):]
+
+    def handle_data(self, data):
+        for tag in self.open_tags:
+            self.tags[tag].string += data
+
+
+_fragment_parser = FragmentParser()
+
+
+def columns_path(queryable: str, key: str) -> str:
+    return f"{dirname(realpath(CACHE_DB))}/cache.columns/{queryable}.{key}.col"
+
+
+def decode_cache(queryable: str, key: str, string: str):
+    """ A value of the database, or the lazy one of its columnar file """
+    value = json.loads(string)
+    if isinstance(value, dict) and "columnar_file" in value:
+        value = columnar.read(columns_path(queryable, key))
+    return value
+
+
+def remove_columns(queryable: str, keys: tuple):
+    """ Files of keys no longer kept as columns """
+    for key in keys:
+        try:
+            os.remove(columns_path(queryable, key))
+        except FileNotFoundError:
+            pass
+
+
+def save_cache(queryable: str, key: str, time: str, value, validators: dict = None, drop: tuple = ()):
+    """ Replaces a single key and deletes the drop keys, in one transaction """
+    open_cache()
 
     try:
-        with open(CACHE_FILE, "w", encoding='utf-8') as f:
-            # logging.debug(f"Saving cache: {_cache}") # Too much info
-            # Dumping directly into file can break a valid cache file
-            string = json.dumps(_cache, ensure_ascii=False, indent=2)
-            f.write(string)
-            logging.info(f"Saved cache")
+        path = columns_path(queryable, key)
+        as_columns = cache_format == "columnar" and columnar.write(path, value)
+        string = json.dumps({"columnar_file": basename(path)} if as_columns else value,
+                            ensure_ascii=False)
+        with _cache:
+            _cache.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (queryable, key, time, string, validators and json.dumps(validators)))
+            _cache.executemany(
+                "DELETE FROM cache WHERE queryable = ? AND key = ?",
+                [(queryable, k) for k in drop])
+        remove_columns(queryable, drop if as_columns else (key, *drop))
+        logging.info(f"Saved cache['{queryable}']['{key}']")
     except Exception as e:
         logging.error(f"Exception ocurred while writing cache file: {e}")
 
 
-def open_cache(force: bool = False):
-    global _cache
+def load_cache(queryable: str, key: str, column: str = "value"):
+    """ Returns (time, encoded column) of a single key, or (None, None) """
+    open_cache()
+
+    try:
+        row = _cache.execute(
+            f"SELECT time, {column} FROM cache WHERE queryable = ? AND key = ?",
+            (queryable, key)).fetchone()
+    except Exception as e:
+        logging.error(f"Exception ocurred while reading cache file: {e}")
+        row = None
+
+    return row or (None, None)
 
-    if not force and _cache is not None:
-        logging.info("Cache was opened already")
-        return
+
+def touch_cache(queryable: str, keys: tuple, time: str):
+    """ Marks keys as cached at time, without rewriting their values """
+    open_cache()
 
     try:
-        with open(CACHE_FILE, "r", encoding='utf-8') as f:
-            if not f.read().strip():
-                logging.info("Cache file is empty")
-                raise FileNotFoundError
+        with _cache:
+            _cache.executemany(
+                "UPDATE cache SET time = ? WHERE queryable = ? AND key = ?",
+                [(time, queryable, key) for key in keys])
+    except Exception as e:
+        logging.error(f"Exception ocurred while writing cache file: {e}")
 
-            f.seek(0)
-            data = json.load(f)
 
-            if isinstance(data, dict):
-                _cache = data
-                logging.info("Opened Cache")
-            else:
-                logging.warning(
-                    f"Cache file is {type(data)} instead of {dict}. Ignoring it")
-    except FileNotFoundError as e:
-        pass
-    except json.JSONDecodeError as e:
-        logging.error(f"Couldn't decode cache file: {e}")
+def response_key(queryable: str, url: str, params: dict = None, cookies: dict = None) -> str:
+    """ The same request of the same user, whatever the order of its params """
+    params = sorted((str(k), [str(i) for i in v] if isinstance(v, (list, tuple)) else str(v))
+                    for k, v in (params or {}).items())
+    user = sorted((str(k), str(v)) for k, v in (cookies or {}).items())
+    return hashlib.sha256(json.dumps([queryable, url, params, user]).encode()).hexdigest()
+
+
+def save_response(key: str, queryable: str, res: Response):
+    """ Compresses the body, then evicts the least recently used ones that don't fit """
+    open_cache()
+    time = datetime.datetime.today().isoformat()
+    body = zlib.compress(res.body)
+
+    try:
+        with _cache:
+            _cache.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, queryable, time, time, str(res.url), res.status, res.encoding, body, len(body)))
+            _cache.execute(EVICT_RESPONSES, (response_cache_mb * 2 ** 20,))
+    except Exception as e:
+        logging.error(f"Exception ocurred while writing cache file: {e}")
+
+
+def load_response(key: str, max_seconds: float) -> Response:
+    """ The response saved in key, if saved less than max_seconds ago """
+    open_cache()
+
+    try:
+        row = _cache.execute(
+            "SELECT time, url, status, encoding, body FROM responses WHERE key = ?",
+            (key,)).fetchone()
+        if row is None:
+            return None
+
+        time_s, url, status, encoding, body = row
+        now = datetime.datetime.today()
+        if (now - datetime.datetime.fromisoformat(time_s)).total_seconds() >= max_seconds:
+            return None
+
+        with _cache:
+            _cache.execute("UPDATE responses SET used = ? WHERE key = ?",
+                           (now.isoformat(), key))
     except Exception as e:
         logging.error(f"Exception ocurred while reading cache file: {e}")
+        return None
+
+    return Response.restore(url, status, zlib.decompress(body), encoding)
+
 
-    if _cache is None:
-        logging.info("Creating empty Cache")
-        _cache = {}
+def import_json_cache():
+    """ Moves the entries of the old whole-file cache.json into the database """
+    try:
+        with open(CACHE_FILE, "r", encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logging.error(f"Couldn't import old cache file: {e}")
+        return
+
+    if not isinstance(data, dict):
+        logging.warning(
+            f"Old cache file is {type(data)} instead of {dict}. Ignoring it")
+        return
+
+    rows = [(queryable, key, time_s, json.dumps(value, ensure_ascii=False))
+            for queryable, keys in data.items() if isinstance(keys, dict)
+            for key, (time_s, value) in keys.items()]
+
+    with _cache:
+        _cache.executemany(
+            "INSERT OR IGNORE INTO cache (queryable, key, time, value) "
+            "VALUES (?, ?, ?, ?)", rows)
+    logging.info(f"Imported {len(rows)} keys from {CACHE_FILE}")
+
+
+def convert_cache(format: str) -> int:
+    """
+    Rewrites the catalogs and indexes cached in another format than
+    format, "json" or "columnar", returning how many were
+    """
+    global cache_format
+    open_cache()
+    cache_format = format
+    converted = 0
+
+    rows = _cache.execute("SELECT queryable, key, time, value, validators FROM cache").fetchall()
+    for queryable, key, time, string, validators in rows:
+        try:
+            value = decode_cache(queryable, key, string)
+            lazy = columnar.is_lazy(value)
+            if lazy == (format == "columnar") or (not lazy and columnar.encode(value) is None):
+                continue
+            value = columnar.materialize(value)
+        except Exception as e:
+            logging.error(f"Couldn't decode cache['{queryable}']['{key}']: {e}")
+            continue
+
+        save_cache(queryable, key, time, value, json.loads(validators or "null"))
+        converted += 1
+
+    return converted
+
+
+def open_cache(force: bool = False):
+    global _cache
+
+    if not force and _cache is not None:
+        return
+
+    try:
+        # WAL lets concurrent invocations read while one of them writes
+        _cache = sqlite3.connect(CACHE_DB, timeout=30)
+        _cache.execute("PRAGMA journal_mode=WAL")
+        _cache.execute(CACHE_TABLE)
+        _cache.execute(RESPONSES_TABLE)
+
+        version = _cache.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            import_json_cache()
+        if version == 1:
+            _cache.execute("ALTER TABLE cache ADD COLUMN validators TEXT")
+        if version < CACHE_VERSION:
+            with _cache:
+                _cache.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+
+        logging.info("Opened Cache")
+    except Exception as e:
+        logging.error(f"Exception ocurred while opening cache file: {e}")
+        logging.info("Creating in-memory Cache")
+        _cache = sqlite3.connect(":memory:")
+        _cache.execute(CACHE_TABLE)
+        _cache.execute(RESPONSES_TABLE)
 
 
 class MissingCookiesError(Exception):
@@ -110,6 +623,15 @@ class Queryable:
 
     END_POINT = ""
 
+    # Arguments of the bs4.SoupStrainer whose matching elements of a page
+    # are the only ones built by parse_html()
+    STRAINER: dict = None
+
+    # Responses reused by fetch() for a while, for searches paging the site
+    RESPONSE_CACHE = False
+    # Listing crawled by `sync`, for searches --offline
+    SYNC = False
+
     @classmethod
     def NAME(cls):
         return cls.__name__.replace("_", " ")
@@ -124,6 +646,10 @@ class Queryable:
             func(msg)
         return msg
 
+    @classmethod
+    def parse_html(cls, content) -> bs4.BeautifulSoup:
+        return make_soup(content, cls.STRAINER and bs4.SoupStrainer(**cls.STRAINER))
+
     @classmethod
     def log_response(cls, res: aiohttp.ClientResponse) -> None:
         if not res:
@@ -133,6 +659,66 @@ class Queryable:
                     f"Requested URL with response: {res.reason} ({res.status})" +
                     f"\n{res.url}")
 
+    @classmethod
+    async def fetch(cls, session: aiohttp.ClientSession, url: str, rate_limit: dict = None, timeout: dict = None,
+                    cache_seconds: float = None, **kwargs) -> Response:
+        """
+        GET url after waiting for its host rate limiter. timeout replaces
+        the session ClientTimeout fields it has. Identical requests in
+        flight are sent only once. With RESPONSE_CACHE, responses are
+        reused for cache_seconds (response_cache_seconds by default)
+        """
+        key = ("fetch", url, json.dumps(kwargs, sort_keys=True, default=str))
+
+        if cache_seconds is None:
+            cache_seconds = response_cache_seconds if cls.RESPONSE_CACHE else 0
+        if not cache_seconds:
+            return await coalesce(key, lambda: cls._fetch(session, url, rate_limit, timeout, **kwargs))
+
+        saved = response_key(cls.__name__, url, kwargs.get("params"), kwargs.get("cookies"))
+        res = load_response(saved, cache_seconds)
+        if res is not None:
+            cls.log(logging.info, f"Using cached response of {url}")
+            request_stats["cached"] += 1
+            timings.count(cls.__name__, "cached")
+            return res
+
+        async def fetch_and_save():
+            res = await cls._fetch(session, url, rate_limit, timeout, **kwargs)
+            if res.ok:
+                save_response(saved, cls.__name__, res)
+            return res
+
+        return await coalesce(key, fetch_and_save)
+
+    @classmethod
+    async def _fetch(cls, session: aiohttp.ClientSession, url: str, rate_limit: dict = None, timeout: dict = None, **kwargs) -> Response:
+        # Spans of the request are grouped by its id, for --timings
+        ctx = timings.request_ctx(cls.__name__)
+        start = perf_counter()
+
+        await get_rate_limiter(url, rate_limit).acquire()
+        if ctx:
+            timings.add_span(cls.__name__, "rate_limit", start, perf_counter(), id=ctx["id"])
+
+        if timeout:
+            kwargs["timeout"] = aiohttp.ClientTimeout(**timeout)
+
+        sent = perf_counter()
+        async with session.get(url=url, trace_request_ctx=ctx, **kwargs) as res:
+            with timings.span(cls.__name__, "body", id=ctx and ctx["id"]):
+                body = (res.ok and await res.read()) or b""
+            res = Response(res, body, perf_counter() - sent)
+
+        if ctx:
+            timings.add_span(cls.__name__, "fetch", start, perf_counter(), id=ctx["id"],
+                             url=str(res.url), status=res.status, bytes=len(body))
+            timings.count(cls.__name__, "requests")
+            timings.count(cls.__name__, "bytes", len(body))
+
+        cls.log_response(res)
+        return res
+
     @classmethod
     def raise_if_missing_cookies(cls, cookies, needed_cookies):
         if not isinstance(needed_cookies, set):
@@ -150,54 +736,167 @@ class Queryable:
             raise ExpiredCookiesError(_error)
 
     @classmethod
-    def write_cache(cls, key, value):
-        global _cache
-        open_cache()
-
+    def write_cache(cls, key, value, validators: dict = None, drop: tuple = ()):
         logging.info(f"Writing cache['{cls.__name__}']['{key}']")
-        time = datetime.datetime.today()
-        _cache.setdefault(cls.__name__, {})[key] = (time.isoformat(), value)
+        time = datetime.datetime.today().isoformat()
+        save_cache(cls.__name__, key, time, value, validators, drop)
+
+        if memory_cache:
+            _memo[(cls.__name__, key)] = (time, value)
+            for k in drop:
+                _memo.pop((cls.__name__, k), None)
+
+    @classmethod
+    def touch_cache(cls, *keys):
+        logging.info(f"Revalidating cache['{cls.__name__}'] {keys}")
+        time = datetime.datetime.today().isoformat()
+        touch_cache(cls.__name__, keys, time)
+
+        for key in keys:
+            if (cls.__name__, key) in _memo:
+                _memo[(cls.__name__, key)] = (time, _memo[(cls.__name__, key)][1])
 
-        save_cache()
+    @classmethod
+    def read_validators(cls, key) -> dict:
+        """ ETag and Last-Modified of the response cached in key, even if expired """
+        _, validators = load_cache(cls.__name__, key, "validators")
+        return json.loads(validators or "{}")
 
     @classmethod
-    def read_cache(cls, key):
-        global _cache
-        open_cache()
+    def read_cache(cls, key, hour_limit: float = None):
+        logging.info(f"Getting cache['{cls.__name__}']['{key}']")
+
+        memo = _memo.get((cls.__name__, key)) if memory_cache else None
+        time_s, value = memo or load_cache(cls.__name__, key)
 
-        if not _cache:
-            logging.info("Cache is empty")
+        if time_s is None or value is None:
+            logging.info(f"cache doesn't exist or is invalid")
             return
 
-        if _cache and cls.__name__ in _cache:
-            logging.info(f"Getting cache['{cls.__name__}']['{key}']")
+        if hour_limit is None:
+            hour_limit = cache_hour_limit
+
+        time = datetime.datetime.fromisoformat(time_s)
+        passed_seconds = (datetime.datetime.today() - time).total_seconds()
+        cache_seconds = hour_limit * 60 * 60
 
-            time_s, value = _cache.get(
-                cls.__name__, {}).get(key) or (None, None)
+        logging.info(
+            f"passed {passed_seconds:.0f} seconds since cached ({passed_seconds / 60 / 60:.4f} hours)")
+
+        if passed_seconds < cache_seconds:
+            logging.info(
+                f"cache still valid ({passed_seconds:.0f} < {cache_seconds}) seconds")
+            if memo:
+                return value
 
-            if time_s is None or value is None:
-                logging.info(f"cache doesn't exist or is invalid")
+            # Only decoded when valid, expired values are never parsed
+            try:
+                value = decode_cache(cls.__name__, key, value)
+            except (json.JSONDecodeError, OSError, ValueError, KeyError) as e:
+                logging.error(f"Couldn't decode cache value: {e}")
                 return
 
-            time = datetime.datetime.fromisoformat(time_s)
-            dt = datetime.datetime.today() - time
+            if memory_cache:
+                _memo[(cls.__name__, key)] = (time_s, value)
+            return value
 
-            passed_hours = dt.seconds / 60 / 60
-            cache_seconds = cache_hour_limit * 60 * 60
+        logging.info(
+            f"cache no longer valid ({passed_seconds:.0f} > {cache_seconds}) seconds")
 
-            logging.info(
-                f"passed {dt.seconds} seconds since cached ({passed_hours:.4f} hours)")
+    @classmethod
+    async def cached_catalog(cls, key, session: aiohttp.ClientSession, url: str,
+                             cache_hour_limit: float = None, stale_while_revalidate: bool = None,
+                             **kwargs) -> list:
+        """
+        A catalog page parsed by parse_page(), cached in key. When expired,
+        it's refreshed with refresh_catalog(), or in the background while
+        the old one is used with stale_while_revalidate
+        """
+        value = cls.read_cache(key, cache_hour_limit)
+        if value is not None:
+            cache_stats["hit"] += 1
+            timings.count(cls.__name__, "hit")
+            return value
+
+        if stale_while_revalidate is None:
+            stale_while_revalidate = globals()["stale_while_revalidate"]
+
+        if stale_while_revalidate:
+            value = cls.read_cache(key, float("inf"))
+            if value is not None:
+                cache_stats["stale"] += 1
+                timings.count(cls.__name__, "stale")
+                cls.log(logging.info, "Using expired catalog while it's refreshed")
+                run_in_background(cls.refresh_catalog(key, session, url, **kwargs),
+                                  name=f"{cls.__name__}_refresh")
+                return value
+
+        return await cls.refresh_catalog(key, session, url, **kwargs)
+
+    @classmethod
+    async def refresh_catalog(cls, key, session: aiohttp.ClientSession, url: str, **kwargs) -> list:
+        """
+        The site is asked if the catalog changed since cached: a 304 only
+        renews the cache, without downloading or parsing anything.
+        Concurrent searches share the same refresh. When the site fails,
+        the expired catalog is kept and used
+        """
+        try:
+            return await coalesce((cls.__name__, "catalog", key),
+                                  lambda: cls._refresh_catalog(key, session, url, **kwargs))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError):
+            value = cls.read_cache(key, float("inf"))
+            if value is None:
+                raise
+            cls.log(logging.warn, "Catalog request failed, using the expired catalog")
+            return value
 
-            if dt.seconds < cache_seconds:
-                logging.info(
-                    f"cache still valid ({dt.seconds} < {cache_seconds}) seconds")
+    @classmethod
+    async def _refresh_catalog(cls, key, session: aiohttp.ClientSession, url: str, **kwargs) -> list:
+        validators = cls.read_validators(key)
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        res = await cls.fetch(session, url, headers=headers, **kwargs)
+
+        if res.status == 304:
+            cache_stats["revalidated"] += 1
+            timings.count(cls.__name__, "revalidated")
+            cls.touch_cache(key, "index")
+            value = cls.read_cache(key, float("inf"))
+            if value is not None:
                 return value
+            res = await cls.fetch(session, url, **kwargs)
 
-            logging.info(
-                f"cache no longer valid ({dt.seconds} > {cache_seconds}) seconds")
-            return
+        # An error page would replace the catalog and its validators
+        if not res.ok:
+            raise ConnectionError(f"{cls.NAME()} - Catalog request failed: {res.reason} ({res.status})")
 
-        logging.info(f"cache['{cls.__name__}'] doesn't exist")
+        cache_stats["miss"] += 1
+        timings.count(cls.__name__, "miss")
+        value = (await run_parser(cls.parse_page, res.text()))["entries"]
+
+        validators = {"etag": res.headers.get("ETag"),
+                      "last_modified": res.headers.get("Last-Modified")}
+        # The index of the old catalog goes with it
+        cls.write_cache(key, value, validators, drop=("index",))
+        return value
+
+    @classmethod
+    def catalog_index(cls, titles: list[str]) -> dict:
+        """ Cached index of a catalog, dropped whenever the catalog is rewritten """
+        index = cls.read_cache("index", float("inf"))
+
+        if (not index or index.get("version") != INDEX_VERSION
+                or index["count"] != len(titles)):
+            cls.log(logging.info, f"Indexing {len(titles)} titles")
+            index = build_index(titles)
+            cls.write_cache("index", index)
+
+        return index
 
     @classmethod
     def parse_data(cls, data: dict) -> dict:
@@ -214,6 +913,10 @@ class Queryable:
         t.title = f"{cls.NAME()} - {data['total']} entries"
         if data['showing'] < data['total']:
             t.title += f" [dim white](Showing {data['showing']})[/]"
+        if data.get('partial'):
+            t.title += " [dim white](Partial)[/]"
+        if data.get('offline'):
+            t.title += f" [dim white](Offline, synced {data['offline'][:16].replace('T', ' ')})[/]"
         return t
 
     @classmethod
@@ -227,11 +930,11 @@ class Queryable:
         url = cls.END_POINT
         params = {**kwargs.get("params", {})}
 
-        async with session.get(url=url, params=params) as res:
-            cls.log_response(res)
-            # j = (res.ok and await res.json(content_type=None)) or {}
-            content = (res.ok and await res.text()) or ""
-            soup = BeautifulSoup(content, 'html.parser')
+        res = await cls.fetch(session, url, params=params,
+                              rate_limit=kwargs.get("rate_limit"),
+                              timeout=kwargs.get("timeout"))
+        # j = res.json() or {}
+        soup = cls.parse_html(res.text())
 
         trs = soup.find_all("tr", class_=re.compile(r"^CLASS$"))
         # assuming trs is already filtered by query
@@ -255,7 +958,43 @@ class Queryable:
         }
 
     @classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    def get_trs(cls, soup: bs4.BeautifulSoup) -> list[bs4.Tag]:
+        return soup.find_all("tr")
+
+    @classmethod
+    def search_total(cls, soup: bs4.BeautifulSoup, trs: list[bs4.Tag]) -> int:
+        return 0
+
+    @classmethod
+    def parse_page(cls, content) -> dict:
+        """
+        Page content in, parsed entries and the total shown by the page out.
+        Only plain data crosses it, so it can run in a worker process
+        """
+        # Login forms are rare, look for one only when it could be there
+        if b"takelogin.php" in content:
+            cls.raise_if_expired_cookies(
+                make_soup(content, bs4.SoupStrainer("form")).find(
+                    "form", action="takelogin.php", method="post"))
+
+        soup = cls.parse_html(content)
+        trs = cls.get_trs(soup)
+
+        return {
+            "entries": cls.parse_entries(trs),
+            "total": cls.search_total(soup=soup, trs=trs),
+        }
+
+    @classmethod
+    async def stream_request(cls, **kwargs):
+        """
+        Yields data dicts as their pages arrive, each with only its own
+        entries. Queryables without pagination yield make_request() once
+        """
+        yield await cls.make_request(**kwargs)
+
+    @classmethod
+    def parse_entries(cls, entries: list) -> list[Entry]:
         new_entries = []
 
         for entry in entries:
@@ -263,17 +1002,17 @@ class Queryable:
             raise NotImplementedError(
                 f"{cls.NAME()} - Data parsing has not yet been implemented.")
 
-            new_entries.append({
-                "title": "",
-                "type": "",
-                "page": "",
-                "command": "",
+            new_entries.append(Entry(
+                title="",
+                type="",
+                page="",
 
-                "size": "",
-                "seeds": 0,
-                "leechers": 0,
-                "completions": 0,
-            })
+                size=as_bytes(""),
+                seeds=0,
+                leechers=0,
+                completions=0,
+                extras={"command": ""},
+            ))
 
         return new_entries
 
@@ -292,7 +1031,7 @@ class Queryable:
         for entry in data['entries']:
 
             style = ""
-            if cell['seeds'] == 0:
+            if cell.seeds == 0:
                 style += " dim"
 
             type_style = {
@@ -300,20 +1039,73 @@ class Queryable:
                 "Complete": "complete",
                 "OVA": "special",
                 "Movie": "movie",
-            }.get(cell['type'], "white")
+            }.get(cell.type, "white")
 
             t.add_row(
-                cell['title'],
-                with_style(cell['type'], type_style),
-                cell['size'],
-                as_link(cell['page']),
+                cell.title,
+                with_style(cell.type, type_style),
+                as_size(cell.size),
+                as_link(cell.page),
                 style=style
             )
 
         return t
 
 
-async def _make_php_request(
+def merge_batch(data: dict, batch: dict) -> dict:
+    """ Adds a batch yielded by stream_request() to the data collected so far """
+    if data is None:
+        return batch
+
+    data["entries"].extend(batch["entries"])
+    data.update({k: v for k, v in batch.items()
+                 if k not in ("entries", "start")})
+    return data
+
+
+async def collect_stream(stream) -> dict:
+    data = None
+    async for batch in stream:
+        data = merge_batch(data, batch)
+    return data
+
+
+async def until_deadline(stream, deadline: float = None):
+    """
+    Batches of stream arriving in deadline seconds. Then the stream is
+    closed, cancelling its requests, and a last empty batch marks the
+    data as partial
+    """
+    if not deadline:
+        async for batch in stream:
+            yield batch
+        return
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    received = False
+
+    try:
+        while True:
+            try:
+                batch = await asyncio.wait_for(stream.__anext__(), end - loop.time())
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                if not received:
+                    raise asyncio.TimeoutError(
+                        f"No results in the {deadline} seconds deadline")
+                logging.warning(f"Deadline of {deadline} seconds reached")
+                yield {"entries": [], "partial": True}
+                return
+
+            received = True
+            yield batch
+    finally:
+        await stream.aclose()
+
+
+async def _stream_php_request(
         cls,
         query: str,
         session: aiohttp.ClientSession,
@@ -321,107 +1113,115 @@ async def _make_php_request(
 
         url: str = None,
         params: dict = None,
-        search_total=None,
-        get_trs=None,
 
         all_pages: bool = False,
         page: int = 0,
         length: int = 30,
+        window: int = MAX_SYNC_REQUESTS,
+        retries: int = MAX_RETRIES,
         **kwargs
-) -> dict:
+):
+    """
+    Yields every site page in order, already parsed. The first page gives
+    the total, then up to window pages are kept in flight until the range
+    is covered
+    """
 
     data = {
-        "entries": [],
         "start": page * length,
         "showing": 0,
         "remaining": 0,
         "total": 0,
-        **kwargs.get("data", {})
     }
 
     if url is None:
         url = cls.END_POINT + "browse.php"
     if params is None:
         params = {"page": 0, "search": query}
-    if not get_trs:
-        def get_trs(soup): return soup.find_all("tr")
 
     cookies = kwargs.get("cookies", {})
     needed_cookies = kwargs.get("needed_cookies", set())
 
     cls.raise_if_missing_cookies(cookies, needed_cookies)
 
-    fails = 0
-
-    site_page_start = (data['start'] + data['showing']) // SITE_PAGE_LENGTH
-
-    async def get_page_trs(i: int):
-        nonlocal fails
-        params['page'] = site_page_start + i
+    async def get_page_entries(site_page: int):
+        page_params = {**params, 'page': site_page}
 
-        async with session.get(url=url, params=params, cookies=cookies) as res:
-            cls.log_response(res)
-            content = (res.ok and await res.read()) or ""
-            soup = BeautifulSoup(content, 'html.parser')
+        for attempt in range(1, retries + 2):
+            if attempt > 1:
+                timings.count(cls.__name__, "retries")
+            try:
+                res = await cls.fetch(session, url, params=page_params, cookies=cookies,
+                                      rate_limit=kwargs.get("rate_limit"),
+                                      timeout=kwargs.get("timeout"),
+                                      cache_seconds=kwargs.get("response_cache_seconds"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                cls.log(logging.warning,
+                        f"Page {site_page} attempt {attempt} failed: {e!r}")
+                continue
 
-            cls.raise_if_expired_cookies(
-                soup.find("form", action="takelogin.php", method="post"))
-
-            # logging.debug(soup.prettify())
-            fails += not res.ok
-
-            trs = get_trs(soup=soup)
+            if not res.ok:
+                cls.log(logging.warning,
+                        f"Page {site_page} attempt {attempt} failed: {res.status}")
+                continue
 
-            if search_total:
-                # Since a request can fail, get maximum value for all
-                data['total'] = max(
-                    data['total'], search_total(soup=soup, trs=trs))
-
-            return trs
-
-    if all_pages:
-        needed = ceildiv(data['remaining'], SITE_PAGE_LENGTH) or MIN_TESTS
-    else:
-        needed = ceildiv(length - data['showing'], SITE_PAGE_LENGTH)
+            page_data = await run_parser(cls.parse_page, res.body)
 
-    needed = min(needed, MAX_SYNC_REQUESTS)
+            # Since pages can disagree, get maximum value for all
+            data['total'] = max(data['total'], page_data['total'])
 
-    for trs in await asyncio.gather(*[get_page_trs(i) for i in range(needed)]):
-        data['entries'].extend(trs)
+            return page_data['entries']
 
-    # If is the first recursive iteration - remove what is before start
-    if not 'data' in kwargs:
-        del data['entries'][:data['start'] % SITE_PAGE_LENGTH]
+        cls.log(logging.error, f"Skipping page {site_page} after {attempt} attempts")
+        return []
 
-    # Limit entries to length
-    if not all_pages:
-        del data['entries'][length:]
-
-    data['showing'] = len(data['entries'])
-    data['total'] = max(data['total'], data['showing'])
-    data['remaining'] = max(
-        0, data['total'] - (data['start'] + data['showing']))
+    def last_site_page() -> int:
+        end = data['total']
+        if not all_pages:
+            end = min(end, data['start'] + length)
+        return ceildiv(end, SITE_PAGE_LENGTH) - 1
 
-    if not fails and data['remaining'] and (all_pages or data['showing'] < length):
-        sleep(RECURSIVE_DELAY)
-        return await _make_php_request(
-            cls=cls,
+    def make_batch(entries: list) -> dict:
+        # Limit entries to length
+        if not all_pages:
+            del entries[length - data['showing']:]
 
-            query=query,
-            session=session,
-            SITE_PAGE_LENGTH=SITE_PAGE_LENGTH,
+        data['showing'] += len(entries)
+        data['total'] = max(data['total'], data['start'] + data['showing'])
+        data['remaining'] = max(
+            0, data['total'] - (data['start'] + data['showing']))
 
-            url=url,
-            params=params,
-            search_total=search_total,
-            process_trs=process_trs,
+        return {**data, "entries": entries, "parsed": True}
 
+    first_site_page = data['start'] // SITE_PAGE_LENGTH
 
-            all_pages=all_pages,
-            page=page,
-            length=length,
+    entries = await get_page_entries(first_site_page)
+    # Remove what is before start
+    del entries[:data['start'] % SITE_PAGE_LENGTH]
+    yield make_batch(entries)
 
-            **{**kwargs, 'data': data}
-        )
+    next_page = next_yield = first_site_page + 1
+    pending = {}
+    finished = {}
 
-    return data
+    try:
+        while next_yield <= last_site_page():
+            while next_page <= last_site_page() and len(pending) < window:
+                pending[next_page] = asyncio.create_task(
+                    get_page_entries(next_page))
+                next_page += 1
+
+            done, _ = await asyncio.wait(
+                pending.values(), return_when=asyncio.FIRST_COMPLETED)
+
+            for site_page, task in list(pending.items()):
+                if task in done:
+                    finished[site_page] = task.result()
+                    del pending[site_page]
+
+            while next_yield in finished:
+                yield make_batch(finished.pop(next_yield))
+                next_yield += 1
+    finally:
+        for task in pending.values():
+            task.cancel()
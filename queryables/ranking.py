@@ -0,0 +1,133 @@
+import re
+import heapq
+import datetime
+from math import log1p
+from itertools import count
+
+from rich.table import Table
+
+from queryables.index import fold
+from queryables.entry import Entry, as_size
+from queryables.queryable import as_link
+
+TOP = 30
+# Score = sum of weight * feature, each feature about 0 to 1 or a log
+WEIGHTS = {"match": 3, "seeds": 1, "completions": 0.5, "recency": 1}
+# Days until an entry's recency halves
+RECENCY_HALF_LIFE = 30
+DATE_FORMATS = ("%H:%M %d-%m-%Y", "%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d")
+
+
+def release_key(title: str) -> str:
+    """
+    The same release in any site: the words of its title, group and
+    episodes in any order, without punctuation or accents
+    """
+    return " ".join(sorted(set(re.findall(r"[a-z0-9]+", fold(title)))))
+
+
+def entry_age(entry: Entry) -> float:
+    """ Days since the entry was uploaded, None if its site doesn't say """
+    date = entry.extras.get("date")
+    if not date:
+        return None
+
+    for fmt in DATE_FORMATS:
+        try:
+            uploaded = datetime.datetime.strptime(date, fmt)
+        except ValueError:
+            continue
+        return max(0, (datetime.datetime.today() - uploaded).total_seconds() / 86400)
+
+
+class Ranking:
+    """
+    The top best scored entries of every queryable, kept in a min heap as
+    their batches arrive, so only the kept ones are ever sorted. Entries
+    of the same release in different sites are collapsed into the best
+    scored one
+    """
+
+    def __init__(self, query: str, top: int = TOP, weights: dict = None):
+        self.query = fold(query)
+        self.top = top
+        self.weights = {**WEIGHTS, **(weights or {})}
+        self.total = 0
+
+        # [score, order, key, queryable, entry, queryables of the release]
+        self.heap = []
+        self.kept = {}
+        self.order = count()
+        # Display names of the queryables
+        self.names = {}
+
+    def score(self, entry: Entry) -> float:
+        w = self.weights
+        score = w["seeds"] * log1p(entry.seeds) + \
+            w["completions"] * log1p(entry.completions)
+
+        pos = fold(entry.title).find(self.query) if self.query else 0
+        if pos >= 0:
+            score += w["match"] / (1 + pos)
+
+        age = entry_age(entry)
+        if age is not None:
+            score += w["recency"] * 0.5 ** (age / RECENCY_HALF_LIFE)
+
+        return score
+
+    def push(self, queryable: str, entries: list[Entry]):
+        for entry in entries:
+            self.total += 1
+            score = self.score(entry)
+            key = release_key(entry.title) or entry.page
+
+            item = self.kept.get(key)
+            # Entries of a site are distinct torrents, only other sites' are collapsed
+            if item and queryable in item[5]:
+                key = entry.page
+                item = self.kept.get(key)
+            if item:
+                item[5].add(queryable)
+                if score > item[0]:
+                    item[:5] = score, next(self.order), key, queryable, entry
+                    heapq.heapify(self.heap)
+                continue
+
+            item = [score, next(self.order), key, queryable, entry, {queryable}]
+
+            if len(self.heap) < self.top:
+                heapq.heappush(self.heap, item)
+            elif score > self.heap[0][0]:
+                del self.kept[heapq.heapreplace(self.heap, item)[2]]
+            else:
+                continue
+
+            self.kept[key] = item
+
+    def results(self) -> list[tuple[str, Entry, set]]:
+        """ (queryable, entry, queryables of the release), best first """
+        return [(i[3], i[4], i[5]) for i in sorted(self.heap, reverse=True)]
+
+    def make_table(self) -> Table:
+        t = Table(title_style="title_style", header_style="header_style")
+        t.title = f"Best {len(self.heap)} of {self.total} entries"
+
+        t.add_column("Site", style="cyan", justify="center")
+        t.add_column("Title")
+        t.add_column("Type", justify="center")
+        t.add_column("Size", justify="right", style="white")
+        t.add_column("Seeds", justify="right")
+        t.add_column("Page Link", style="dim")
+
+        for queryable, entry, sites in self.results():
+            t.add_row(
+                ", ".join(self.names.get(s, s) for s in sorted(sites, key=lambda s: s != queryable)),
+                entry.title,
+                entry.type,
+                as_size(entry.size),
+                str(entry.seeds) if entry.seeds else "",
+                as_link(entry.page),
+            )
+
+        return t
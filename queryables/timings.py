@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+from time import perf_counter
+from itertools import count as counter
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from rich.table import Table
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Stages shown by the summary, in order, with the request ones first
+STAGES = ("rate_limit", "queued", "dns", "connect", "ttfb", "body",
+          "parse_page", "parse_data", "make_table", "render")
+LABELS = {"dns": "DNS", "ttfb": "TTFB"}
+
+# Off until --timings, then every span and counter of the search is kept
+enabled = False
+# [queryable, name, start, end, args], in seconds since enable()
+spans = []
+counters = defaultdict(Counter)
+_ids = counter(1)
+_start = 0.0
+
+
+def enable():
+    global enabled, _start
+    enabled = True
+    spans.clear()
+    counters.clear()
+    _start = perf_counter()
+
+
+def add_span(queryable: str, name: str, start: float, end: float, **args):
+    """ start and end from perf_counter(). Spans with an id may overlap others """
+    if enabled:
+        spans.append([queryable, name, start - _start, end - _start, args])
+
+
+@contextmanager
+def span(queryable: str, name: str, **args):
+    if not enabled:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        add_span(queryable, name, start, perf_counter(), **args)
+
+
+def count(queryable: str, name: str, n: int = 1):
+    if enabled:
+        counters[queryable][name] += n
+
+
+def request_ctx(queryable: str) -> dict:
+    """ trace_request_ctx of a request, which its spans are grouped by """
+    return {"queryable": queryable, "id": next(_ids)} if enabled else None
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """ Connection spans of the requests given a request_ctx() """
+    import aiohttp
+
+    def begin(name: str):
+        async def record(session, ctx, params):
+            ctx.begins = getattr(ctx, "begins", {})
+            ctx.begins[name] = perf_counter()
+        return record
+
+    def end(name: str):
+        async def record(session, ctx, params):
+            request = ctx.trace_request_ctx
+            begins = getattr(ctx, "begins", {})
+            if request and name in begins:
+                add_span(request["queryable"], name, begins[name], perf_counter(),
+                         id=request["id"])
+        return record
+
+    config = aiohttp.TraceConfig()
+    config.on_connection_queued_start.append(begin("queued"))
+    config.on_connection_queued_end.append(end("queued"))
+    config.on_dns_resolvehost_start.append(begin("dns"))
+    config.on_dns_resolvehost_end.append(end("dns"))
+    config.on_connection_create_start.append(begin("connect"))
+    config.on_connection_create_end.append(end("connect"))
+    # From the request sent to the response headers
+    config.on_request_headers_sent.append(begin("ttfb"))
+    config.on_request_end.append(end("ttfb"))
+    return config
+
+
+def summary() -> dict[str, dict]:
+    """ Milliseconds of each stage, counters and wall time of each queryable """
+    sites = defaultdict(lambda: {"stages": Counter(), "first": None, "last": 0.0})
+
+    for queryable, name, start, end, _ in spans:
+        site = sites[queryable]
+        site["stages"][name] += (end - start) * 1000
+        site["first"] = start if site["first"] is None else min(site["first"], start)
+        site["last"] = max(site["last"], end)
+
+    return {queryable: {
+        "stages": dict(site["stages"]),
+        "counters": dict(counters[queryable]),
+        "wall": (site["last"] - site["first"]) * 1000,
+    } for queryable, site in sites.items()}
+
+
+def make_table(names: dict = None) -> Table:
+    """ Summed milliseconds of each stage, overlapping requests add up """
+    names = names or {}
+    t = Table(title_style="title_style", header_style="header_style")
+    t.title = "Timings (ms)"
+
+    t.add_column("Site", style="cyan")
+    for column in ("requests", "bytes", *STAGES, "wall"):
+        t.add_column(LABELS.get(column, column.replace("_", " ").capitalize()), justify="right")
+    t.add_column("Cache")
+    t.add_column("Retries", justify="right")
+
+    for queryable, site in summary().items():
+        c = site["counters"]
+        t.add_row(
+            names.get(queryable, queryable),
+            str(c.get("requests", 0)),
+            f"{c.get('bytes', 0):,}",
+            *(f"{site['stages'][s]:.1f}" if s in site["stages"] else "" for s in STAGES),
+            f"{site['wall']:.1f}",
+            ", ".join(f"{c[k]} {k}" for k in ("hit", "stale", "revalidated", "merged", "miss", "cached") if c.get(k)),
+            str(c.get("retries", "")),
+        )
+
+    return t
+
+
+def chrome_trace() -> dict:
+    """
+    Trace Event Format, for chrome://tracing and Perfetto: a thread for
+    each queryable, with requests as async events since they overlap
+    """
+    tids = {}
+    events = []
+
+    for queryable, name, start, end, args in spans:
+        tid = tids.setdefault(queryable, len(tids) + 1)
+        event = {"name": name, "cat": queryable, "pid": 1, "tid": tid, "ts": start * 1e6,
+                 "args": {k: v for k, v in args.items() if k != "id"}}
+
+        if "id" in args:
+            events.append({**event, "ph": "b", "id": args["id"]})
+            events.append({**event, "ph": "e", "id": args["id"], "ts": end * 1e6})
+        else:
+            events.append({**event, "ph": "X", "dur": (end - start) * 1e6})
+
+    events.extend({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                   "args": {"name": queryable}} for queryable, tid in tids.items())
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_trace(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
@@ -1,20 +1,38 @@
 from queryables.queryable import *
 
 MAX_LENGTH = 1000
+# Entries asked at once with --show-everything are learned from past
+# responses, for each to take about TARGET_SECONDS and TARGET_BYTES
+MIN_LENGTH = 100
+TARGET_SECONDS = 2
+TARGET_BYTES = 8 * 2 ** 20
 
 
 class Uniotaku(Queryable):
 
     END_POINT = "https://tracker.uniotaku.com/"
+    RESPONSE_CACHE = True
+    SYNC = True
 
     @classmethod
-    async def make_request(cls, query: str, session: aiohttp.ClientSession, all_pages=False, page=0, length=30, **kwargs) -> dict:
+    async def make_request(cls, **kwargs) -> dict:
+        return await collect_stream(cls.stream_request(**kwargs))
 
-        start = page * length + kwargs.get("rec_start", 0)
-
-        if all_pages and length != MAX_LENGTH:
-            length = MAX_LENGTH
-            page = 0
+    @classmethod
+    async def stream_request(cls, query: str, session: aiohttp.ClientSession, all_pages=False, page=0, length=30,
+                             window: int = MAX_SYNC_REQUESTS, retries: int = MAX_RETRIES, **kwargs):
+        """
+        The first response gives recordsFiltered, then the offsets left
+        are asked up to window at once, yielded in order. With all_pages,
+        each asks the learned page length, learned again unless some
+        offsets failed after their retries
+        """
+        start = page * length
+        showing = 0
+        failed = False
+
+        if all_pages:
+            length = cls.page_length()
 
         url = cls.END_POINT + "torrents_.php"
         params = {
@@ -30,81 +48,174 @@ class Uniotaku(Queryable):
             "search[regex]": "false",
             **kwargs.get("params", {})
         }
+        # (entries, seconds, bytes) of the responses not cached
+        samples = []
+
+        async def get_entries(offset: int, size: int) -> dict:
+            nonlocal failed
+
+            for attempt in range(1, retries + 2):
+                if attempt > 1:
+                    timings.count(cls.__name__, "retries")
+                try:
+                    res = await cls.fetch(session, url, params={**params, "start": offset, "length": size},
+                                          rate_limit=kwargs.get("rate_limit"),
+                                          timeout=kwargs.get("timeout"),
+                                          cache_seconds=kwargs.get("response_cache_seconds"))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    cls.log(logging.warning, f"Entries from {offset} attempt {attempt} failed: {e!r}")
+                    continue
+
+                if not res.ok:
+                    cls.log(logging.warning, f"Entries from {offset} attempt {attempt} failed: {res.status}")
+                    continue
+
+                page_data = await run_parser(cls.parse_page, res.body)
+
+                if res.elapsed and page_data["entries"]:
+                    samples.append((len(page_data["entries"]), res.elapsed, len(res.body)))
+                return page_data
+
+            cls.log(logging.error, f"Skipping entries from {offset} after {attempt} attempts")
+            failed = True
+            return {"entries": [], "total": 0}
+
+        def make_batch(entries: list, total: int) -> dict:
+            nonlocal showing
+            showing += len(entries)
+            total = max(start + showing, total)
+
+            return {
+                "entries": entries,
+                "start": start,
+                "showing": showing,
+                "remaining": max(0, total - (start + showing)),
+                "total": total,
+                "parsed": True,
+            }
+
+        page_data = await get_entries(start, length)
+        entries = page_data["entries"]
+        total = page_data["total"]
+        yield make_batch(entries, total)
+
+        if not entries:
+            return
+
+        # The site may serve less than asked, then it's asked that much
+        served = len(entries)
+        step = served if served < length and start + served < total else length
+        end = total if all_pages else min(total, start + length)
+
+        offsets = iter(range(start + served, end, step))
+        pending = {}
+
+        try:
+            while True:
+                for offset in offsets:
+                    pending[offset] = asyncio.create_task(get_entries(offset, min(step, end - offset)))
+                    if len(pending) >= window:
+                        break
+
+                if not pending:
+                    break
+
+                # In order, the next ones are already on their way
+                offset = min(pending)
+                page_data = await pending.pop(offset)
+                yield make_batch(page_data["entries"], max(total, page_data["total"]))
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+            # Lengths aren't learned from runs with gaps
+            if all_pages and not failed:
+                cls.learn_page_length(samples, length, step if step < length else None)
 
-        async with session.get(url=url, params=params) as res:
-            cls.log_response(res)
-            j = (res.ok and await res.json(content_type=None)) or {}
-
-        entries = kwargs.get("entries", [])
-        entries.extend(j.get("data", ()))
-        showing = len(entries)
-
-        total = max(showing, j.get("recordsFiltered", 0))
-        remaining = max(0, total - (kwargs.get("rec_start", start) + showing))
-
-        if res.ok and remaining and (all_pages or showing < length):
-            sleep(RECURSIVE_DELAY)
-            return await cls.make_request(
-                query=query, session=session,
-                all_pages=all_pages, page=page+1, length=length,
-                **{**kwargs,
-                    'entries': entries,
-                    'rec_start': kwargs.get("rec_start", start),
-                   }
-            )
+    @classmethod
+    def page_length(cls) -> int:
+        """ The length learned by learn_page_length(), MAX_LENGTH at first """
+        learned = cls.read_cache("page_length", float("inf")) or {}
+        return learned.get("length", MAX_LENGTH)
+
+    @classmethod
+    def learn_page_length(cls, samples: list[tuple], length: int, served: int = None):
+        """
+        The length whose response would take TARGET_SECONDS and
+        TARGET_BYTES, at the rate of the samples, at most doubling or
+        halving at once, and never over what the site served
+        """
+        if not samples:
+            return
+
+        entries = sum(n for n, _, _ in samples)
+        seconds = sum(t for _, t, _ in samples) / entries
+        size = sum(b for _, _, b in samples) / entries
+
+        learned = cls.read_cache("page_length", float("inf")) or {}
+        most = min(served or float("inf"), learned.get("served") or float("inf"))
+
+        new_length = min(TARGET_SECONDS / seconds, TARGET_BYTES / size, length * 2)
+        new_length = int(min(max(new_length, length / 2, MIN_LENGTH), most))
+
+        cls.log(logging.info, f"{seconds * 1000:.2f} ms and {size:.0f} bytes an entry, "
+                              f"asking {new_length} entries at once instead of {length}")
+        cls.write_cache("page_length", {"length": new_length,
+                                        "served": most if most != float("inf") else None})
 
+    @classmethod
+    def parse_page(cls, content) -> dict:
+        j = (content and json.loads(content)) or {}
         return {
-            "entries": entries,
-            "start": kwargs.get("rec_start", start),
-            "showing": showing,
-            "remaining": remaining,
-            "total": total,
+            "entries": cls.parse_entries(j.get("data", ())),
+            "total": j.get("recordsFiltered", 0),
         }
 
     @classmethod
-    def parse_entries(cls, entries: list) -> list[dict]:
+    def parse_entries(cls, entries: list) -> list[Entry]:
 
         new_entries = []
         for cell in entries:
             # '<a target="_blank" href="torrents-details.php?id=3681">Kakyuusei (1999) + Especial + OST</a>  <img class='tipr' title='Gold Coin' src='images/free.gif' border='0' alt='' />'
-            torrent = get_tag(cell[0], "a")
-            coin = get_tag(cell[0], "img")
+            tags = get_tags(cell[0])
+            torrent = tags.get("a")
+            coin = tags.get("img")
 
             # '<img border="0" src="./images/categories/completo.png" alt="Anime Completo ">'
-            _type = get_attr(get_tag(cell[1], "img"), "alt")
+            _type = get_attr(get_tags(cell[1]).get("img"), "alt")
             if _type == "Anime Completo":
                 _type = "Completo"
             if _type == "Anime":
                 _type = "Episodios"
 
             # '<a href="https://www.tenroufansub.com/2018/05/fairy-tail-final-series.html" target="_blank"><i class="fas fa-lg fa-fw m-r-10 fa-download"></i></a>'
-            external_link = get_tag(cell[2], "a")
+            external_link = get_tags(cell[2]).get("a")
 
             # '<a target="_blank" href="https://tracker.uniotaku.com/teams-view.php?id=41">Tenrou Fansub</a>'
-            group = get_tag(cell[7], "a")
+            group = get_tags(cell[7]).get("a")
 
             # '<a href="account-details.php?id=13668">1qwertyuiop</a>'
-            uploader = get_tag(cell[8], "a")
-
-            new_entries.append({
-                "title": get_body(torrent),
-                "page": cls.END_POINT + get_href(torrent),
-                "coin": get_attr(coin, "title"),
-
-                "type": _type,
-                "external_link": get_href(external_link),
-
-                "seeds": int(cell[3] or 0),
-                "leechers": int(cell[4] or 0),
-                "completions": int(cell[5] or 0),
-                "size": cell[6],
-
-                "group_name": get_body(group),
-                "group_link": get_href(group),
-
-                "uploader_name": get_body(uploader),
-                "uploader_link": cls.END_POINT + get_href(uploader),
-            })
+            uploader = get_tags(cell[8]).get("a")
+
+            new_entries.append(Entry(
+                title=get_body(torrent),
+                page=cls.END_POINT + get_href(torrent),
+                type=_type,
+
+                seeds=int(cell[3] or 0),
+                leechers=int(cell[4] or 0),
+                completions=int(cell[5] or 0),
+                size=as_bytes(cell[6]),
+
+                uploader=get_body(uploader),
+                extras={
+                    "coin": get_attr(coin, "title"),
+                    "external_link": get_href(external_link),
+                    "group_name": get_body(group),
+                    "group_link": get_href(group),
+                    "uploader_link": cls.END_POINT + get_href(uploader),
+                },
+            ))
 
         return new_entries
 
@@ -123,9 +234,9 @@ class Uniotaku(Queryable):
             style = {
                 "Gold Coin": "bright_yellow",
                 "Silver Coin": "light_sky_blue1",
-            }.get(cell['coin'], "")
+            }.get(cell.extras['coin'], "")
 
-            if cell['seeds'] == 0:
+            if cell.seeds == 0:
                 style += " dim"
 
             type_style = {
@@ -134,14 +245,14 @@ class Uniotaku(Queryable):
                 "OVA": "special",
                 "Filme": "movie",
                 "Hentai": "nsfw",
-            }.get(cell['type'], "white")
+            }.get(cell.type, "white")
 
             t.add_row(
-                cell['title'],
-                with_style(cell['type'], type_style),
-                as_link(cell['page']),
-                cell['size'],
-                cell['group_name'],
+                cell.title,
+                with_style(cell.type, type_style),
+                as_link(cell.page),
+                as_size(cell.size),
+                cell.extras['group_name'],
                 style=style,
             )
 